@@ -1,22 +1,1416 @@
 # Note: Run the following in terminal to login to Internet Archive...
 # ia configure --username="your_email_here" --password="your_password_here"
 
+import asyncio
 import requests
-from bs4 import BeautifulSoup
-from urllib.parse import urljoin, urlparse
+from requests.adapters import HTTPAdapter
+from bs4 import BeautifulSoup, __version__ as BS4_VERSION
+try:
+    # Private module - the 'stream' backend is unavailable if a bs4 release moves it
+    from bs4.builder._htmlparser import BeautifulSoupHTMLParser
+except ImportError:
+    BeautifulSoupHTMLParser = None
+from bs4.dammit import EntitySubstitution
+from bs4.formatter import HTMLFormatter
+try:
+    from selectolax.lexbor import LexborHTMLParser
+except ImportError:
+    LexborHTMLParser = None
+from urllib.parse import urljoin, urlparse, urlsplit, urlunsplit, parse_qsl
+import functools
+import itertools
 import hashlib
+import heapq
+import gzip
+import zlib
 import os
 import time
 import json
 from datetime import datetime, timedelta
+from email.utils import parsedate_to_datetime
 from pathlib import Path
 import logging
+import re
 import shutil
+import sqlite3
 import tempfile
+from types import SimpleNamespace
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/131.0.0.0 Safari/537.36'
+}
+# HTML parser backends, fastest first
+PARSER_BACKENDS = ('selectolax', 'stream', 'lxml', 'html.parser')
+# Backends whose normalized output is identical to html.parser's (see tests/test_parser_backends.py);
+# 'auto' picks the first one installed. selectolax and lxml build different trees for malformed
+# markup (implied end tags, bare fragments, unknown entities...), so they're opt-in only.
+CONFORMING_PARSER_BACKENDS = ('stream', 'html.parser')
+
+# BeautifulSoup output conventions, so the selectolax fast path normalizes pages
+# to the same text as the BeautifulSoup backends
+SOUP_VOID_ELEMENTS = frozenset([
+    'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'keygen', 'link', 'menuitem', 'meta',
+    'param', 'source', 'track', 'wbr', 'basefont', 'bgsound', 'command', 'frame', 'image', 'isindex',
+    'nextid', 'spacer'
+])
+SOUP_MULTI_VALUED_ATTRIBUTES = {
+    '*': ('class', 'accesskey', 'dropzone'),
+    'a': ('rel', 'rev'),
+    'link': ('rel', 'rev'),
+    'td': ('headers',),
+    'th': ('headers',),
+    'form': ('accept-charset',),
+    'object': ('archive',),
+    'area': ('rel',),
+    'icon': ('sizes',),
+    'iframe': ('sandbox',),
+    'output': ('for',),
+}
+SOUP_RAW_TEXT_ELEMENTS = frozenset(['script', 'style'])
+
+
+def installed_parser_backends():
+    """Parser backends importable in this environment, fastest first"""
+    installed = []
+    for backend in PARSER_BACKENDS:
+        try:
+            if backend == 'selectolax':
+                import selectolax.lexbor
+            elif backend == 'lxml':
+                import lxml
+            elif backend == 'stream' and BeautifulSoupHTMLParser is None:
+                continue
+        except ImportError:
+            continue
+        installed.append(backend)
+    return installed
+
+
+def get_parser_backend(requested='auto'):
+    """Resolve a parser backend name ('auto' = fastest installed one that matches html.parser)"""
+    installed = installed_parser_backends()
+    if requested == 'auto':
+        return next(backend for backend in installed if backend in CONFORMING_PARSER_BACKENDS)
+    if requested not in PARSER_BACKENDS:
+        raise ValueError(f"Unknown parser backend: {requested}")
+    if requested not in installed:
+        raise ImportError(f"Parser backend {requested} is not installed")
+    return requested
+
+
+def _escape_soup_text(text):
+    return text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+
+
+DOCTYPE_PATTERN = re.compile(r'<!doctype ?([^>]*)>', re.IGNORECASE)
+META_CONTENT_CHARSET_PATTERN = re.compile(r'((^|;)\s*charset=)([^;]*)', re.M)
+
+
+def quote_soup_attribute(value):
+    """Attribute value escaped and quoted the way str(soup) prints it"""
+    value = _escape_soup_text(value)
+    if '"' in value:
+        if "'" in value:
+            return '"' + value.replace('"', '&quot;') + '"'
+        return "'" + value + "'"
+    return '"' + value + '"'
+
+
+def format_soup_start_tag(name, attributes, rewrite_attribute=None):
+    """Start tag the way str(soup) prints it, from a dict of attribute name -> value"""
+    multi_valued = SOUP_MULTI_VALUED_ATTRIBUTES['*'] + SOUP_MULTI_VALUED_ATTRIBUTES.get(name, ())
+    if name == 'meta':
+        # str(soup) re-declares the output encoding in <meta> tags
+        if 'charset' in attributes:
+            attributes = dict(attributes, charset='utf-8')
+        elif attributes.get('http-equiv', '').lower() == 'content-type' and 'content' in attributes:
+            attributes = dict(attributes, content=META_CONTENT_CHARSET_PATTERN.sub(r'\1utf-8', attributes['content']))
+
+    parts = [name]
+    for attr_name, value in sorted(attributes.items()):
+        if attr_name in multi_valued:
+            # Kept as a list of values in the soup, so rewriting never sees these
+            value = ' '.join(value.split())
+        elif rewrite_attribute:
+            value = rewrite_attribute(name, attr_name, value)
+        parts.append(f"{attr_name}={quote_soup_attribute(value)}")
+
+    return '<' + ' '.join(parts) + ('/>' if name in SOUP_VOID_ELEMENTS else '>')
+
+
+def serialize_lexbor_like_soup(tree, html, rewrite_attribute=None):
+    """Serialize a selectolax (lexbor) tree the way str(BeautifulSoup(...)) does
+
+    html is the source document (lexbor canonicalizes the doctype, BeautifulSoup
+    keeps it as written). rewrite_attribute(tag_name, name, value) -> value can
+    adjust attribute values on the way out without touching the tree.
+    """
+    document = tree.root.parent if tree.root is not None else None
+    if document is None:
+        return ''
+
+    def children(node):
+        child = node.child
+        while child is not None:
+            yield child
+            child = child.next
+
+    out = []
+    # Iterative walk, so deeply nested pages can't hit the recursion limit
+    stack = [(child, False) for child in reversed(list(children(document)))]
+    while stack:
+        node, closing = stack.pop()
+        tag = node.tag
+        if closing:
+            out.append(f"</{tag.lower()}>")
+        elif tag == '-text':
+            parent = node.parent.tag.lower() if node.parent is not None else ''
+            text = node.text_content or ''
+            out.append(text if parent in SOUP_RAW_TEXT_ELEMENTS else _escape_soup_text(text))
+        elif tag == '-comment':
+            out.append(node.html)
+        elif tag == '-doctype':
+            doctype = DOCTYPE_PATTERN.search(html)
+            out.append(f"<!DOCTYPE {doctype.group(1)}>\n" if doctype else node.html + '\n')
+        elif not tag.startswith('-'):
+            name = tag.lower()
+            attributes = {key.lower(): value or '' for key, value in node.attributes.items()}
+            out.append(format_soup_start_tag(name, attributes, rewrite_attribute))
+            if name not in SOUP_VOID_ELEMENTS:
+                stack.append((node, True))
+                stack.extend((child, False) for child in reversed(list(children(node))))
+
+    return ''.join(out)
+
+
+class AttributeRewritingFormatter(HTMLFormatter):
+    """Serializes a soup exactly like str(soup), substituting attribute values on the way out
+
+    rewrite(tag, name, value) -> value is called for every attribute, so callers
+    can change what gets written without modifying the tree itself.
+    """
+
+    def __init__(self, rewrite):
+        # Same settings as the 'minimal' formatter str(soup) uses
+        super().__init__(entity_substitution=EntitySubstitution.substitute_xml)
+        self.rewrite = rewrite
+
+    def attributes(self, tag):
+        return [(name, self.rewrite(tag, name, value)) for name, value in super().attributes(tag)]
+
+
+class ParsedPage:
+    """A page's HTML, parsed lazily and at most once per parser
+
+    Change detection, CHANGES.txt and rewriting all read the same trees, so none
+    of them may modify one: anything they change is applied while serializing
+    (see AttributeRewritingFormatter).
+    """
+
+    def __init__(self, html, soup_features='html.parser'):
+        self.html = html
+        self.soup_features = soup_features
+        self._soups = {}
+        self._lexbor = None
+
+    @property
+    def soup(self):
+        """BeautifulSoup tree built with soup_features (the one pages are rewritten from)"""
+        return self.soup_with(self.soup_features)
+
+    def soup_with(self, features):
+        """BeautifulSoup tree built with the given parser"""
+        if features not in self._soups:
+            self._soups[features] = BeautifulSoup(self.html, features)
+        return self._soups[features]
+
+    @property
+    def lexbor(self):
+        """selectolax (lexbor) tree"""
+        if self._lexbor is None:
+            self._lexbor = LexborHTMLParser(self.html)
+        return self._lexbor
+
+
+# Noise removed from pages before they are compared, applied in order. A rule replaces
+# `pattern` with `replacement` (literal, or a template if it contains backslashes) or runs
+# a built-in `action`. 'attribute' rules apply to the listed tag attributes, the rest to
+# the serialized page. 'merge': True folds a rule into the previous rule's regex pass -
+# worth it for patterns without a literal prefix, which re can't search for quickly anyway.
+# Patterns with backreferences can't be merged.
+DEFAULT_NORMALIZATION_RULES = [
+    # Campaign and click-tracking query parameters in links ('*' matches a prefix)
+    {'name': 'tracking_params', 'scope': 'attribute',
+     'attributes': {'a': ['href'], 'link': ['href'], 'script': ['href', 'src'], 'img': ['href', 'src']},
+     'action': 'strip_query_params',
+     'params': ['utm_*', 'fbclid', 'gclid', 'gclsrc', 'dclid', 'msclkid', 'mc_cid', 'mc_eid',
+                '_ga', '_gl', '_hsenc', '_hsmi']},
+    # Cloudflare challenge parameters (change on every request)
+    {'name': 'cloudflare_params', 'pattern': r"window\.__CF\$cv\$params=\{[^}]+\}",
+     'replacement': "window.__CF$cv$params={[REMOVED]}"},
+    {'name': 'cloudflare_ray', 'pattern': r"r:'[a-f0-9]+'", 'replacement': "r:'[REMOVED]'"},
+    {'name': 'cloudflare_token', 'pattern': r"t:'[A-Za-z0-9+/=]+'", 'replacement': "t:'[REMOVED]'"},
+    # Relative time indicators (like "5 days ago", "19 h.") update constantly
+    {'name': 'relative_time', 'pattern': r'\d+\s*(h\.|hours?|mins?|minutes?|days?|weeks?|months?)\s*(ago)?\.?',
+     'replacement': '[TIME]', 'ignore_case': True},
+    # Facebook pixel tracking
+    {'name': 'facebook_pixel', 'pattern': r'<img[^>]*facebook\.com/tr[^>]*>', 'replacement': ''},
+    {'name': 'whitespace', 'action': 'collapse_whitespace'},
+]
+
+
+def _collapse_whitespace_action(rule):
+    """Collapse every whitespace run to a single space"""
+    return lambda text: (' '.join(text.split()), 1)
+
+
+def _strip_query_params_action(rule):
+    """Drop the query parameters named in rule['params'] from a URL, keeping the rest as written"""
+    exact = {param for param in rule['params'] if not param.endswith('*')}
+    prefixes = tuple(param[:-1] for param in rule['params'] if param.endswith('*'))
+
+    # The same links repeat all over a site, so results are memoized per distinct value
+    @functools.lru_cache(maxsize=rule.get('cache_size', 4096))
+    def strip(url):
+        if '?' not in url:
+            return url, 0
+        try:
+            parts = urlsplit(url)
+        except ValueError:
+            return url, 0
+
+        kept = []
+        for segment in parts.query.split('&'):
+            # parse_qsl decodes the name ('utm%5Fsource', 'utm_source=' and 'utm_source' all match)
+            pairs = parse_qsl(segment, keep_blank_values=True)
+            name = pairs[0][0] if pairs else ''
+            if name not in exact and not name.startswith(prefixes):
+                kept.append(segment)
+
+        removed = parts.query.count('&') + 1 - len(kept)
+        if not removed:
+            return url, 0
+        return urlunsplit(parts._replace(query='&'.join(kept))), removed
+
+    return strip
+
+
+class NormalizationEngine:
+    """Applies normalization rules, compiled once
+
+    Rules marked 'merge' share one alternation with the rule before them, so that
+    pass scans the text once however many rules it holds. hits counts matches per
+    rule; timings is the time spent per pass, keyed by its rule names.
+    """
+
+    # action name -> factory(rule) returning a function text -> (text, hits)
+    ACTIONS = {
+        'collapse_whitespace': _collapse_whitespace_action,
+        'strip_query_params': _strip_query_params_action,
+    }
+
+    def __init__(self, rules=None):
+        # A list of rule dicts, or the path of a JSON file holding one
+        if rules is None:
+            rules = DEFAULT_NORMALIZATION_RULES
+        elif isinstance(rules, (str, Path)):
+            with open(rules, 'r', encoding='utf-8') as f:
+                rules = json.load(f)
+        self.rules = [dict(rule) for rule in rules]
+        for rule in self.rules:
+            if 'name' not in rule or ('pattern' in rule) == ('action' in rule):
+                raise ValueError(f"Normalization rule needs a name and either a pattern or an action: {rule}")
+            if 'action' in rule and rule['action'] not in self.ACTIONS:
+                raise ValueError(f"Unknown normalization action: {rule['action']}")
+
+        self.fingerprint = hashlib.sha256(json.dumps(self.rules, sort_keys=True).encode('utf-8')).hexdigest()[:12]
+        self.reset_stats()
+
+        self.text_rules = [rule for rule in self.rules if rule.get('scope') != 'attribute']
+        self.text_passes = self._compile_passes(self.text_rules)
+
+        # (tag name, attribute) -> passes; targets covered by the same rules share compiled passes
+        targets = {}
+        for rule in self.rules:
+            if rule.get('scope') == 'attribute':
+                for tag_name, attributes in rule['attributes'].items():
+                    for attribute in attributes:
+                        targets.setdefault((tag_name, attribute), []).append(rule)
+        compiled = {}
+        self.attribute_passes = {}
+        for target, target_rules in targets.items():
+            key = tuple(rule['name'] for rule in target_rules)
+            if key not in compiled:
+                compiled[key] = self._compile_passes(target_rules)
+            self.attribute_passes[target] = compiled[key]
+
+    def reset_stats(self):
+        self.hits = {rule['name']: 0 for rule in self.rules}
+        self.timings = {}
+
+    def _compile_passes(self, rules):
+        """Group merged rules with the rule before them and compile one pass function per group"""
+        groups = []
+        for rule in rules:
+            if rule.get('merge') and 'pattern' in rule and groups and 'pattern' in groups[-1][0]:
+                groups[-1].append(rule)
+            else:
+                groups.append([rule])
+        return [self._compile_pass(group) for group in groups]
+
+    def _compile_pass(self, rules):
+        """Function applying `rules` in a single scan, counting hits and time"""
+        label = '+'.join(rule['name'] for rule in rules)
+
+        if 'action' in rules[0]:
+            name, action = rules[0]['name'], self.ACTIONS[rules[0]['action']](rules[0])
+
+            def apply(text):
+                start = time.perf_counter()
+                text, hits = action(text)
+                self.hits[name] += hits
+                self.timings[label] = self.timings.get(label, 0.0) + time.perf_counter() - start
+                return text
+            return apply
+
+        regexes = [re.compile(rule['pattern'], re.IGNORECASE if rule.get('ignore_case') else 0) for rule in rules]
+
+        if len(rules) == 1:
+            name, regex, replacement = rules[0]['name'], regexes[0], rules[0]['replacement']
+
+            def apply(text):
+                start = time.perf_counter()
+                text, hits = regex.subn(replacement, text)
+                self.hits[name] += hits
+                self.timings[label] = self.timings.get(label, 0.0) + time.perf_counter() - start
+                return text
+            return apply
+
+        # One scan where the leftmost match wins - the same result as separate passes
+        # unless one rule's replacement creates or breaks another's match
+        merged = re.compile('|'.join(
+            f"(?P<_rule{index}>{'(?i:' if rule.get('ignore_case') else '(?:'}{rule['pattern']}))"
+            for index, rule in enumerate(rules)
+        ))
+
+        def replace(match):
+            index = int(match.lastgroup[5:])
+            rule = rules[index]
+            self.hits[rule['name']] += 1
+            if '\\' in rule['replacement']:
+                return regexes[index].sub(rule['replacement'], match.group(), count=1)
+            return rule['replacement']
+
+        def apply(text):
+            start = time.perf_counter()
+            text = merged.sub(replace, text)
+            self.timings[label] = self.timings.get(label, 0.0) + time.perf_counter() - start
+            return text
+        return apply
+
+    def normalize_attribute(self, tag_name, name, value):
+        """Attribute value with attribute rules applied (unchanged if none cover it)"""
+        passes = self.attribute_passes.get((tag_name, name))
+        if passes is None or not isinstance(value, str):
+            return value
+        for apply in passes:
+            value = apply(value)
+        return value
+
+    def normalize_text(self, text):
+        """Serialized page with text rules applied"""
+        for apply in self.text_passes:
+            text = apply(text)
+        return text
+
+    def streaming_text_passes(self):
+        """Text passes for a page normalized in pieces, and whether whitespace collapsing is left to the caller
+
+        A final collapse_whitespace rule has to see across pieces, so StreamingNormalizer
+        does it itself instead.
+        """
+        if self.text_rules and self.text_rules[-1].get('action') == 'collapse_whitespace':
+            self.hits[self.text_rules[-1]['name']] += 1
+            return self.text_passes[:-1], True
+        return self.text_passes, False
+
+
+class StreamingNormalizer:
+    """Normalizes a page token by token, without building a tree
+
+    Runs BeautifulSoup's own html.parser tokenizer but stands in for the soup it would
+    build: tags are closed the way its tree builder closes them and each token is
+    printed the way str(soup) prints it, so the result is what the html.parser backend
+    produces. Printed tokens go through the text rules in batches and on to write(), so
+    working memory is bounded by BATCH_SIZE plus the largest single token. A text rule
+    match can't span two batches.
+    """
+
+    FEED_SIZE = 65536
+    BATCH_SIZE = 65536
+    ASCII_SPACES = '\x20\x0a\x09\x0c\x0d'
+    PRESERVE_WHITESPACE_ELEMENTS = frozenset(['pre', 'textarea'])
+
+    # What BeautifulSoupHTMLParser reads from the soup it feeds
+    builder = SimpleNamespace(attribute_dict_class=dict, store_line_numbers=False)
+    VOID_TAG = SimpleNamespace(is_empty_element=True)
+    OPEN_TAG = SimpleNamespace(is_empty_element=False)
+
+    def __init__(self, engine, write):
+        self.engine = engine
+        self.write = write
+        self.text_passes, self.collapse_whitespace = engine.streaming_text_passes()
+        self.contains_replacement_characters = False
+
+        self.open_tags = []
+        self.open_counts = {}
+        self.preserving_whitespace = 0
+        self.current_data = []
+
+        self.batch = []
+        self.batch_size = 0
+        self.started = False
+        self.space_pending = False
+
+    def feed(self, html):
+        """Normalize a whole page into write()"""
+        parser = BeautifulSoupHTMLParser(self, convert_charrefs=False)
+        for start in range(0, len(html), self.FEED_SIZE):
+            parser.feed(html[start:start + self.FEED_SIZE])
+        parser.close()
+
+        # Tags still open at the end are closed, as the soup would close them
+        self.endData()
+        while self.open_tags:
+            self._pop_tag()
+        self._flush()
+
+    # Tree-construction calls made by BeautifulSoupHTMLParser
+
+    def handle_starttag(self, name, namespace, nsprefix, attrs, *args, **kwargs):
+        self.endData()
+        self._emit(format_soup_start_tag(name, attrs, self.engine.normalize_attribute))
+
+        # Void tags are opened too - the parser closes them straight away
+        self.open_tags.append(name)
+        self.open_counts[name] = self.open_counts.get(name, 0) + 1
+        if name in self.PRESERVE_WHITESPACE_ELEMENTS:
+            self.preserving_whitespace += 1
+        return self.VOID_TAG if name in SOUP_VOID_ELEMENTS else self.OPEN_TAG
+
+    def handle_endtag(self, name, nsprefix=None):
+        self.endData()
+        # Closes every tag opened since the most recent open `name`; stray end tags are ignored
+        if self.open_counts.get(name):
+            while self._pop_tag() != name:
+                pass
+
+    def handle_data(self, data):
+        self.current_data.append(data)
+
+    def endData(self, containerClass=None):
+        if not self.current_data:
+            return
+        text = ''.join(self.current_data)
+        self.current_data = []
+
+        # The soup keeps whitespace-only strings as a single space or newline
+        if not self.preserving_whitespace and not text.strip(self.ASCII_SPACES):
+            text = '\n' if '\n' in text else ' '
+
+        if containerClass is not None:
+            # Comment, Doctype, CData... printed as they are
+            self._emit(containerClass.PREFIX + text + containerClass.SUFFIX)
+        elif self.open_tags and self.open_tags[-1] in SOUP_RAW_TEXT_ELEMENTS:
+            self._emit(text)
+        else:
+            self._emit(_escape_soup_text(text))
+
+    def _pop_tag(self):
+        name = self.open_tags.pop()
+        self.open_counts[name] -= 1
+        if name in self.PRESERVE_WHITESPACE_ELEMENTS:
+            self.preserving_whitespace -= 1
+        if name not in SOUP_VOID_ELEMENTS:
+            self._emit(f"</{name}>")
+        return name
+
+    # Output
+
+    def _emit(self, token):
+        self.batch.append(token)
+        self.batch_size += len(token)
+        if self.batch_size >= self.BATCH_SIZE:
+            self._flush()
+
+    def _flush(self):
+        text = ''.join(self.batch)
+        self.batch = []
+        self.batch_size = 0
+        for apply in self.text_passes:
+            text = apply(text)
+
+        if not self.collapse_whitespace:
+            if text:
+                self.write(text)
+            return
+
+        # ' '.join(page.split()), carried across batches
+        words = text.split()
+        if not words:
+            self.space_pending = self.space_pending or bool(text)
+            return
+        if self.started and (self.space_pending or text[0].isspace()):
+            self.write(' ')
+        self.write(' '.join(words))
+        self.started = True
+        self.space_pending = text[-1].isspace()
+
+
+def normalize_parsed_page(page, parser_backend, normalizer):
+    """Normalize a ParsedPage for comparison, leaving its trees untouched"""
+    if parser_backend == 'stream':
+        pieces = []
+        StreamingNormalizer(normalizer, pieces.append).feed(page.html)
+        return ''.join(pieces)
+
+    if parser_backend == 'selectolax':
+        # Fast path: lexbor parse, serialized in BeautifulSoup's format
+        text = serialize_lexbor_like_soup(page.lexbor, page.html, normalizer.normalize_attribute)
+    else:
+        # Serializing through BeautifulSoup normalizes all tag formatting;
+        # attribute rules (tracking parameters) are applied on the way out
+        formatter = AttributeRewritingFormatter(
+            lambda tag, name, value: normalizer.normalize_attribute(tag.name, name, value)
+        )
+        soup = page.soup_with('lxml' if parser_backend == 'lxml' else 'html.parser')
+        text = soup.decode(formatter=formatter)
+
+    # Cloudflare tokens, relative times, tracking pixels, whitespace...
+    return normalizer.normalize_text(text)
+
+
+def is_stylesheet_link(tag):
+    """Asset handler match for <link rel="stylesheet">"""
+    return 'stylesheet' in tag.get('rel', [])
+
+
+def collect_asset_refs(soup, page_url, asset_handlers):
+    """Asset references in a soup as (tag, attribute, absolute URL), and the number of inline styles with URLs
+
+    One walk over the tree, dispatching through the handler table.
+    """
+    asset_refs = []
+    inline_style_urls = 0
+    wildcard_handlers = asset_handlers.get('*', [])
+
+    for tag in soup.find_all(True):
+        for attribute, match in asset_handlers.get(tag.name, []) + wildcard_handlers:
+            if tag.get(attribute) and (match is None or match(tag)):
+                asset_refs.append((tag, attribute, urljoin(page_url, tag[attribute])))
+
+        # Process inline styles with URLs
+        # Simple URL extraction from CSS (could be improved)
+        if 'url(' in tag.get('style', ''):
+            inline_style_urls += 1
+
+    return asset_refs, inline_style_urls
+
+
+# Stands in for an asset link in pages rewritten by worker processes, until the asset is saved
+ASSET_PLACEHOLDER = '\x00asset:%d\x00'
+ASSET_PLACEHOLDER_PATTERN = re.compile(r'"\x00asset:(\d+)\x00"')
+
+# Per-process state of a CPU worker (WebsiteArchiver cpu_workers)
+_page_worker = None
+
+
+def _init_page_worker(parser_backend, soup_features, normalization_rules, asset_handlers, sketch):
+    global _page_worker
+    _page_worker = SimpleNamespace(
+        parser_backend=parser_backend,
+        soup_features=soup_features,
+        normalizer=NormalizationEngine(normalization_rules),
+        asset_handlers=asset_handlers,
+        sketch=sketch,
+    )
+
+
+def _summarize_in_worker(html):
+    """Normalize one page in a worker process -> (summarize_normalized fields, rule hits, pass timings)
+
+    Only the summary travels back to the parent; the normalized text is
+    recomputed there for the few pages that turn out to have changed.
+    """
+    normalizer = _page_worker.normalizer
+    normalizer.reset_stats()
+    if _page_worker.parser_backend == 'stream':
+        summary = summarize_normalized(lambda write: StreamingNormalizer(normalizer, write).feed(html),
+                                       _page_worker.sketch)
+    else:
+        page = ParsedPage(html, _page_worker.soup_features)
+        normalized = normalize_parsed_page(page, _page_worker.parser_backend, normalizer)
+        summary = summarize_normalized(lambda write: write(normalized), _page_worker.sketch)
+    return summary, normalizer.hits, normalizer.timings
+
+
+def _prepare_rewrite_in_worker(task):
+    """Parse and serialize one page in a worker process, with a placeholder for every asset link
+
+    task is (html, page URL). Returns (template, [(asset URL, original value)],
+    inline style count); placeholder i stands for the i-th reference.
+    """
+    html, page_url = task
+    soup = ParsedPage(html, _page_worker.soup_features).soup
+    asset_refs, inline_style_urls = collect_asset_refs(soup, page_url, _page_worker.asset_handlers)
+
+    placeholders = {}
+    refs = []
+    for index, (tag, attr, asset_url) in enumerate(asset_refs):
+        placeholders[(id(tag), attr)] = ASSET_PLACEHOLDER % index
+        refs.append((asset_url, tag[attr]))
+
+    formatter = AttributeRewritingFormatter(lambda tag, name, value: placeholders.get((id(tag), name), value))
+    return soup.decode(formatter=formatter), refs, inline_style_urls
+
+
+DIVERGENCE_CHUNK_SIZE = 65536
+
+
+def common_prefix_length(a, b, limit=None):
+    """Length of the common prefix of two strings
+
+    Compares whole chunks with slice equality (a memcmp in C) and only bisects
+    inside the first chunk that differs, so megabyte pages cost a handful of
+    Python-level steps instead of one per character.
+    """
+    if limit is None:
+        limit = min(len(a), len(b))
+    position = 0
+    while position < limit:
+        step = min(DIVERGENCE_CHUNK_SIZE, limit - position)
+        if a[position:position + step] == b[position:position + step]:
+            position += step
+            continue
+        # The first mismatch lies in [low, high)
+        low, high = position, position + step
+        while high - low > 1:
+            middle = (low + high) // 2
+            if a[low:middle] == b[low:middle]:
+                low = middle
+            else:
+                high = middle
+        return low
+    return limit
+
+
+def find_divergence(a, b):
+    """Bound the region where two strings differ
+
+    Returns None if they are equal, otherwise (start, a_end, b_end) such that
+    a[:start] == b[:start], a[a_end:] == b[b_end:], and a[start:a_end] and
+    b[start:b_end] are the changed regions. The common suffix never overlaps
+    the common prefix.
+    """
+    if a == b:
+        return None
+    start = common_prefix_length(a, b)
+    suffix = common_prefix_length(a[::-1], b[::-1], min(len(a), len(b)) - start)
+    return start, len(a) - suffix, len(b) - suffix
+
+
+# Removed / added text kept per hunk in changes.json; offsets and lengths are always exact
+DIFF_EXCERPT_LIMIT = 1000
+
+# Diff tokens: whole tags, words with their trailing whitespace, and stray whitespace.
+# Every character belongs to exactly one token, so token offsets map back to text offsets.
+DIFF_TOKEN_PATTERN = re.compile(r'<[^>]*>?|[^<\s]+\s*|\s+')
+
+
+def myers_diff(a, b, max_work=None):
+    """Shortest edit script between two sequences, using Myers' O(ND) algorithm
+
+    Returns (opcodes, work): difflib-style opcodes [(tag, i1, i2, j1, j2)], or None
+    once more than max_work steps (diagonal moves plus edits) have been spent
+    without reaching the end, and the steps spent - the cost grows with the number
+    of differences, not just the length.
+    """
+    n, m = len(a), len(b)
+    max_d = n + m if max_work is None else min(n + m, max_work)
+    offset = max_d + 1
+    # v[offset + k] = furthest x reached on diagonal k (y = x - k)
+    v = [0] * (2 * max_d + 3)
+    trace = []
+    work = 0
+
+    for d in range(max_d + 1):
+        # Endpoints of the d-1 paths, for backtracking
+        trace.append(v[offset - d - 1:offset + d + 2])
+        for k in range(-d, d + 1, 2):
+            if k == -d or (k != d and v[offset + k - 1] < v[offset + k + 1]):
+                x = v[offset + k + 1]
+            else:
+                x = v[offset + k - 1] + 1
+            y = x - k
+            snake_start = x
+            while x < n and y < m and a[x] == b[y]:
+                x += 1
+                y += 1
+            v[offset + k] = x
+            work += x - snake_start + 1
+            if x >= n and y >= m:
+                return _myers_opcodes(trace, n, m), work
+        if max_work is not None and work > max_work:
+            return None, work
+    return None, work
+
+
+def _myers_opcodes(trace, n, m):
+    """Walk a Myers trace back from (n, m) and group the moves into opcodes"""
+    moves = []
+    x, y = n, m
+    for d in range(len(trace) - 1, -1, -1):
+        v = trace[d]
+        base = d + 1  # index of diagonal 0 in this trace entry
+        k = x - y
+        if k == -d or (k != d and v[base + k - 1] < v[base + k + 1]):
+            prev_k = k + 1
+        else:
+            prev_k = k - 1
+        prev_x = v[base + prev_k]
+        prev_y = prev_x - prev_k
+
+        # One edit from the previous endpoint, then a diagonal run of equal items
+        if prev_k == k + 1:
+            mid_x, mid_y = prev_x, prev_y + 1
+        else:
+            mid_x, mid_y = prev_x + 1, prev_y
+        if x > mid_x:
+            moves.append(('equal', mid_x, x, mid_y, y))
+        if d > 0:
+            moves.append(('insert' if prev_k == k + 1 else 'delete', prev_x, mid_x, prev_y, mid_y))
+        x, y = prev_x, prev_y
+
+    opcodes = []
+    for tag, i1, i2, j1, j2 in reversed(moves):
+        if opcodes and (opcodes[-1][0] == 'equal') == (tag == 'equal'):
+            last_tag, last_i1, _, last_j1, _ = opcodes[-1]
+            if last_tag != tag:
+                tag = 'replace'
+            opcodes[-1] = (tag, last_i1, i2, last_j1, j2)
+        else:
+            opcodes.append((tag, i1, i2, j1, j2))
+    return opcodes
+
+
+def diff_normalized(previous, current, max_work=None, anchors=()):
+    """Token-level diff of two normalized pages
+
+    anchors are (previous_offset, current_offset, length) spans known to be
+    identical in both pages, in document order (see compare_merkle_trees); only
+    the text between them is diffed. Within each stretch, only the region between
+    the common prefix and suffix is tokenized and aligned. max_work steps are
+    shared by the whole page: the region where they run out, and every region
+    after it, is reported as one hunk and 'complete' is False.
+    Hunk offsets are character offsets; 'removed' and 'added' hold the text only
+    up to DIFF_EXCERPT_LIMIT chars.
+    """
+    result = {'complete': True, 'removed_chars': 0, 'added_chars': 0, 'hunks': []}
+    remaining_work = max_work
+    previous_position = current_position = 0
+    for previous_offset, current_offset, length in [*anchors, (len(previous), len(current), 0)]:
+        # Anchors come from stored hashes - make sure the text really is the same
+        if (previous_offset < previous_position or current_offset < current_position
+                or previous[previous_offset:previous_offset + length] != current[current_offset:current_offset + length]):
+            continue
+        work = _diff_region(result, previous, current, previous_position, previous_offset,
+                            current_position, current_offset, remaining_work)
+        if remaining_work is not None:
+            remaining_work -= work
+        previous_position = previous_offset + length
+        current_position = current_offset + length
+    return result
+
+
+def _diff_region(result, previous, current, previous_start, previous_end, current_start, current_end, max_work):
+    """Add the hunks for previous[previous_start:previous_end] vs current[current_start:current_end]
+
+    Returns the alignment steps spent, at most about max_work (None = no limit).
+    """
+    divergence = find_divergence(previous[previous_start:previous_end], current[current_start:current_end])
+    if divergence is None:
+        return 0
+    prefix, previous_stop, current_stop = divergence
+    previous_start, previous_end = previous_start + prefix, previous_start + previous_stop
+    current_start, current_end = current_start + prefix, current_start + current_stop
+
+    opcodes, work = None, 0
+    if max_work is None or max_work > 0:
+        previous_tokens = DIFF_TOKEN_PATTERN.findall(previous, previous_start, previous_end)
+        current_tokens = DIFF_TOKEN_PATTERN.findall(current, current_start, current_end)
+        opcodes, work = myers_diff(previous_tokens, current_tokens, max_work)
+    if opcodes is None:
+        # Out of work: the whole region is one hunk
+        result['complete'] = False
+        _add_hunk(result, previous, current, previous_start, previous_end, current_start, current_end)
+        return work
+
+    # Token index -> character offset in the page
+    previous_offsets = list(itertools.accumulate(map(len, previous_tokens), initial=previous_start))
+    current_offsets = list(itertools.accumulate(map(len, current_tokens), initial=current_start))
+
+    for tag, i1, i2, j1, j2 in opcodes:
+        if tag != 'equal':
+            _add_hunk(result, previous, current, previous_offsets[i1], previous_offsets[i2],
+                      current_offsets[j1], current_offsets[j2])
+    return work
+
+
+def _add_hunk(result, previous, current, previous_start, previous_stop, current_start, current_stop):
+    result['hunks'].append({
+        'previous_offset': previous_start,
+        'previous_length': previous_stop - previous_start,
+        'current_offset': current_start,
+        'current_length': current_stop - current_start,
+        'removed': _diff_excerpt(previous, previous_start, previous_stop),
+        'added': _diff_excerpt(current, current_start, current_stop),
+    })
+    result['removed_chars'] += previous_stop - previous_start
+    result['added_chars'] += current_stop - current_start
+
+
+def _diff_excerpt(text, start, stop, limit=None):
+    """text[start:stop], cut to the first `limit` chars (DIFF_EXCERPT_LIMIT) with a note of what's left out"""
+    limit = DIFF_EXCERPT_LIMIT if limit is None else limit
+    if stop - start <= limit:
+        return text[start:stop]
+    return f"{text[start:start + limit]}... [{stop - start - limit:,} more chars]"
+
+
+def format_diff_hunks(diff, previous, current, max_hunks=20, context=60, limit=300):
+    """Render diff_normalized hunks for CHANGES.txt, with some unchanged text around each"""
+    def clip(text, length):
+        return _diff_excerpt(text, 0, length, limit)
+
+    lines = []
+    for hunk in diff['hunks'][:max_hunks]:
+        previous_start = hunk['previous_offset']
+        previous_stop = previous_start + hunk['previous_length']
+        lines.append(f"  @@ -{previous_start},{hunk['previous_length']} "
+                     f"+{hunk['current_offset']},{hunk['current_length']} @@")
+        lines.append(f"    ...{previous[max(0, previous_start - context):previous_start]}")
+        if hunk['removed']:
+            lines.append(f"  - {clip(hunk['removed'], hunk['previous_length'])}")
+        if hunk['added']:
+            lines.append(f"  + {clip(hunk['added'], hunk['current_length'])}")
+        lines.append(f"    {previous[previous_stop:previous_stop + context]}...")
+    if len(diff['hunks']) > max_hunks:
+        lines.append(f"  ... {len(diff['hunks']) - max_hunks} more changed regions (see changes.json)")
+    return lines
+
+
+# Elements that get their own node in a page's Merkle tree
+MERKLE_REGION_TAGS = frozenset([
+    'html', 'head', 'body', 'header', 'footer', 'nav', 'main', 'section', 'article', 'aside',
+    'div', 'form', 'figure', 'blockquote', 'details', 'table', 'thead', 'tbody', 'tfoot', 'tr',
+    'ul', 'ol', 'li', 'dl', 'p', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6',
+])
+MERKLE_TAG_PATTERN = re.compile(r'<(/?)([a-zA-Z][^\s/>]*)([^>]*)>')
+MERKLE_ID_PATTERN = re.compile(r'\sid="([^"]+)"')
+MERKLE_CLASS_PATTERN = re.compile(r'\sclass="\s*([^"\s]+)')
+# Layout of the trees in merkle.json.gz; files in any other layout are ignored
+MERKLE_FORMAT = 'rows'
+
+
+class MerkleBuilder:
+    """Merkle tree of hashes over the regions of a normalized page
+
+    Scans the normalized serialization, which is balanced and escaped, so no
+    parser is needed and the tree ignores exactly the noise the fingerprint
+    ignores. Text can be fed in chunks (e.g. from StreamingNormalizer).
+
+    The tree is a flat list of [hash, label, offset, length, parent index] rows
+    in document (pre-)order, so no step - building, JSON, comparing - recurses
+    however deeply a page is nested. Row 0 is the whole page, with parent -1.
+    Offsets are character offsets in the normalized text. A node's hash covers
+    its own text and its children's hashes, so equal hashes mean equal subtrees.
+    """
+
+    def __init__(self):
+        self.buffer = ''
+        self.base = 0  # offset of buffer[0] in the page
+        self.raw_end = None  # '</script' etc. while inside raw text
+        self.rows = []
+        # Open elements as (name, node or None), and the open nodes alone
+        self.nodes = [self._node('', 0)]
+        self.stack = [('', self.nodes[0])]
+
+    def _node(self, label, offset):
+        parent = self.nodes[-1]['index'] if self.rows else -1
+        self.rows.append([None, label, offset, None, parent])
+        return {'index': len(self.rows) - 1, 'digest': hashlib.sha256()}
+
+    def feed(self, text):
+        self.buffer += text
+        self._scan(final=False)
+
+    def close(self):
+        """Finish the page and return its rows"""
+        self._scan(final=True)
+        end = self.base + len(self.buffer)
+        while len(self.nodes) > 1:
+            self._close_node(end)
+        self._finish(self.nodes[0], end)
+        return self.rows
+
+    def _text(self, text):
+        if text:
+            self.nodes[-1]['digest'].update(text.encode('utf-8'))
+
+    def _scan(self, final):
+        buf = self.buffer
+        pos = 0
+        size = len(buf)
+        while pos < size:
+            if self.raw_end:
+                end = buf.find(self.raw_end, pos)
+                if end < 0:
+                    # Keep back what could be the start of a split end tag
+                    keep = size if final else max(pos, size - len(self.raw_end) + 1)
+                    self._text(buf[pos:keep])
+                    pos = keep
+                    break
+                self._text(buf[pos:end])
+                pos = end
+                self.raw_end = None
+
+            lt = buf.find('<', pos)
+            if lt < 0:
+                self._text(buf[pos:])
+                pos = size
+                break
+            self._text(buf[pos:lt])
+            pos = lt
+
+            close = '-->' if buf.startswith('<!--', pos) else '>'
+            end = buf.find(close, pos + 1)
+            if end < 0:
+                if final:
+                    self._text(buf[pos:])
+                    pos = size
+                break
+            end += len(close)
+            self._tag(buf[pos:end], self.base + pos, self.base + end)
+            pos = end
+
+        self.buffer = buf[pos:]
+        self.base += pos
+
+    def _tag(self, tag, start, end):
+        match = MERKLE_TAG_PATTERN.fullmatch(tag)
+        if not match:
+            # Comment, doctype or stray '<'
+            self._text(tag)
+            return
+
+        closing, name, attrs = match.groups()
+        name = name.lower()
+        if closing:
+            if not any(open_name == name for open_name, _ in self.stack):
+                self._text(tag)
+                return
+            # Close any elements left open inside this one
+            while self.stack[-1][0] != name:
+                _, node = self.stack.pop()
+                if node:
+                    self._close_node(start)
+            self._text(tag)
+            _, node = self.stack.pop()
+            if node:
+                self._close_node(end)
+        elif name in SOUP_VOID_ELEMENTS or attrs.endswith('/'):
+            self._text(tag)
+        else:
+            node = None
+            if name in MERKLE_REGION_TAGS:
+                label = name
+                id_match = MERKLE_ID_PATTERN.search(attrs)
+                class_match = MERKLE_CLASS_PATTERN.search(attrs)
+                if id_match:
+                    label += f"#{id_match.group(1)}"
+                elif class_match:
+                    label += f".{class_match.group(1)}"
+                node = self._node(label, start)
+                self.nodes.append(node)
+            self._text(tag)
+            self.stack.append((name, node))
+            if name in SOUP_RAW_TEXT_ELEMENTS:
+                self.raw_end = f"</{name}"
+
+    def _close_node(self, end):
+        hash_hex = self._finish(self.nodes.pop(), end)
+        self.nodes[-1]['digest'].update(b'\x00' + bytes.fromhex(hash_hex))
+
+    def _finish(self, node, end):
+        row = self.rows[node['index']]
+        row[0] = node['digest'].hexdigest()[:16]
+        row[3] = end - row[2]
+        return row[0]
+
+
+def build_merkle_tree(normalized):
+    """Merkle tree (see MerkleBuilder) of a normalized page held in memory"""
+    builder = MerkleBuilder()
+    builder.feed(normalized)
+    return builder.close()
+
+
+def compare_merkle_trees(previous, current, max_work=None):
+    """Walk two Merkle trees (MerkleBuilder rows) down the branches whose hashes differ
+
+    Children are aligned by hash, so an inserted list item doesn't make every
+    later sibling look changed. max_work alignment steps are shared by the whole
+    tree; once they run out, each remaining node that differs is reported as
+    changed as a whole. Returns (regions, anchors): the deepest regions
+    that differ, as dicts with a 'status' of changed / added / removed, and the
+    (previous_offset, current_offset, length) of identical subtrees, in document
+    order, for diff_normalized to skip.
+    """
+    regions = []
+    anchors = []
+    if previous[0][0] == current[0][0]:
+        return regions, [(previous[0][2], current[0][2], previous[0][3])]
+
+    def children_of(rows):
+        children = [[] for _ in rows]
+        for index in range(1, len(rows)):
+            children[rows[index][4]].append(index)
+        return children
+
+    def region(status, prev, curr):
+        # Labels from the page down to this node
+        rows, index = (current, curr) if curr is not None else (previous, prev)
+        labels = []
+        while index > 0:
+            labels.append(rows[index][1])
+            index = rows[index][4]
+        labels.reverse()
+        if len(labels) > 8:
+            labels[3:-3] = [f"({len(labels) - 6} more)"]
+        entry = {'status': status, 'path': ' > '.join(labels) or '(page)'}
+        if prev is not None:
+            entry['previous_offset'], entry['previous_length'] = previous[prev][2], previous[prev][3]
+        if curr is not None:
+            entry['current_offset'], entry['current_length'] = current[curr][2], current[curr][3]
+        return entry
+
+    prev_children, curr_children = children_of(previous), children_of(current)
+    remaining_work = max_work
+    # Explicit stack of ('walk', prev, curr), ('anchor', span) and ('region', entry),
+    # pushed in reverse so results still come out in document order
+    pending = [('walk', 0, 0)]
+    while pending:
+        kind, *item = pending.pop()
+        if kind == 'anchor':
+            anchors.append(item[0])
+            continue
+        if kind == 'region':
+            regions.append(item[0])
+            continue
+
+        prev_kids, curr_kids = prev_children[item[0]], curr_children[item[1]]
+        steps = []
+        localized = False
+        opcodes = None
+        if remaining_work is None or remaining_work > 0:
+            opcodes, work = myers_diff([previous[i][0] for i in prev_kids], [current[i][0] for i in curr_kids],
+                                       remaining_work)
+            if remaining_work is not None:
+                remaining_work -= work
+        for tag, i1, i2, j1, j2 in opcodes or []:
+            if tag == 'equal':
+                for prev_child, curr_child in zip(prev_kids[i1:i2], curr_kids[j1:j2]):
+                    steps.append(('anchor', (previous[prev_child][2], current[curr_child][2], previous[prev_child][3])))
+                continue
+            localized = True
+            # Same-label siblings at the same position are edits; the rest were added or removed
+            paired = 0
+            for prev_child, curr_child in zip(prev_kids[i1:i2], curr_kids[j1:j2]):
+                if previous[prev_child][1] != current[curr_child][1]:
+                    break
+                steps.append(('walk', prev_child, curr_child))
+                paired += 1
+            for prev_child in prev_kids[i1 + paired:i2]:
+                steps.append(('region', region('removed', prev_child, None)))
+            for curr_child in curr_kids[j1 + paired:j2]:
+                steps.append(('region', region('added', None, curr_child)))
+        if not localized:
+            # Only this node's own text differs
+            steps.append(('region', region('changed', item[0], item[1])))
+        pending.extend(reversed(steps))
+    return regions, anchors
+
+
+# Bottom-k MinHash over shingles of normalized tokens: runs of text between whitespace and
+# angle brackets (words, tag names, attributes), which can be cut apart anywhere between tokens
+SIMILARITY_TOKEN_PATTERN = re.compile(r'[^\s<>]+')
+SIMILARITY_SHINGLE_SIZE = 5
+SIMILARITY_SKETCH_SIZE = 128
+SIMILARITY_HASH_MASK = (1 << 64) - 1
+
+
+class SimilaritySketcher:
+    """Bottom-k MinHash sketch of a normalized page, fed in chunks
+
+    Tokens are hashed with CRC-32 and each run of SIMILARITY_SHINGLE_SIZE token
+    hashes with Python's tuple hash (stable for ints across runs and processes),
+    all in C. Pages with fewer tokens than that are sketched from single tokens.
+    The sketch is the SIMILARITY_SKETCH_SIZE smallest shingle hashes, as one hex
+    string for the manifest. Only those are kept between chunks, so memory
+    doesn't grow with the page.
+    """
+
+    def __init__(self):
+        self.carry = ''
+        self.tail = []  # last token hashes, for shingles that span chunks
+        self.token_count = 0
+        self.shingles = set()  # smallest shingle hashes so far
+
+    def feed(self, text):
+        text = self.carry + text
+        # Only tokenize up to the last separator, so no token is split between chunks
+        cut = max(map(text.rfind, ' \t\n\r\f\v<>')) + 1
+        self.carry = text[cut:]
+        self._add(text[:cut])
+
+    def close(self):
+        self._add(self.carry)
+        self.carry = ''
+        if self.token_count < SIMILARITY_SHINGLE_SIZE:
+            # Too short for a single shingle - the tail holds every token
+            self.shingles = set(map(SIMILARITY_HASH_MASK.__and__, map(hash, zip(self.tail))))
+        return ''.join(f"{value:016x}" for value in sorted(self.shingles))
+
+    def _add(self, text):
+        tokens = SIMILARITY_TOKEN_PATTERN.findall(text)
+        self.token_count += len(tokens)
+        hashes = self.tail + list(map(zlib.crc32, map(str.encode, tokens)))
+        size = SIMILARITY_SHINGLE_SIZE
+        shingles = zip(*(hashes[i:] for i in range(size)))
+        self.shingles.update(map(SIMILARITY_HASH_MASK.__and__, map(hash, shingles)))
+        if len(self.shingles) > SIMILARITY_SKETCH_SIZE:
+            # The smallest of the union are among the smallest of each part
+            self.shingles = set(heapq.nsmallest(SIMILARITY_SKETCH_SIZE, self.shingles))
+        self.tail = hashes[-(size - 1):]
+
+
+def similarity_sketch(normalized):
+    """SimilaritySketcher sketch of a normalized page held in memory"""
+    sketcher = SimilaritySketcher()
+    sketcher.feed(normalized)
+    return sketcher.close()
+
+
+def estimate_similarity(previous_sketch, current_sketch):
+    """Estimated Jaccard similarity (0-1) of the shingle sets behind two sketches
+
+    An empty sketch (a page without any text or tags) says nothing about what
+    changed, so it is never similar to anything.
+    """
+    previous = {int(previous_sketch[i:i + 16], 16) for i in range(0, len(previous_sketch), 16)}
+    current = {int(current_sketch[i:i + 16], 16) for i in range(0, len(current_sketch), 16)}
+    if not previous or not current:
+        return 0.0
+    # The smallest hashes of the union are a uniform sample of it
+    sample = heapq.nsmallest(SIMILARITY_SKETCH_SIZE, previous | current)
+    return sum(1 for value in sample if value in previous and value in current) / len(sample)
+
+
+def summarize_normalized(produce, sketch=False):
+    """Fingerprint, Merkle tree and optionally similarity sketch of a normalized page, in one pass
+
+    produce(write) must call write() with the normalized text, whole or in chunks
+    (e.g. StreamingNormalizer), and each chunk goes to every consumer in turn.
+    Returns the temp page fields {'normalized_hash', 'normalized_length', 'merkle'},
+    plus 'similarity_sketch' if sketch is true.
+    """
+    digest = hashlib.sha256()
+    builder = MerkleBuilder()
+    sketcher = SimilaritySketcher() if sketch else None
+    length = 0
+
+    def write(text):
+        nonlocal length
+        digest.update(text.encode('utf-8'))
+        builder.feed(text)
+        if sketcher:
+            sketcher.feed(text)
+        length += len(text)
+
+    produce(write)
+    summary = {'normalized_hash': digest.hexdigest(), 'normalized_length': length, 'merkle': builder.close()}
+    if sketcher:
+        summary['similarity_sketch'] = sketcher.close()
+    return summary
+
+
+class ContentHasher:
+    """Hashing used by the asset store
+
+    identity() is the full-length SHA-256 hex digest that names and keys every
+    stored asset. fast() is an optional pre-hash used to recognise content already
+    seen in the current run, so repeats can skip SHA-256. 'auto' only enables
+    BLAKE3, whose matches can be trusted as they are. xxh3-128 has to be asked for:
+    it is not collision resistant, so its matches are confirmed against the stored
+    file, which only pays off when assets repeat a lot.
+    """
+
+    LEGACY_KEY_LENGTH = 16  # older stores keyed assets by a truncated SHA-256
+
+    def __init__(self, fast_algorithm='auto'):
+        self.fast_name = None
+        self.fast_is_cryptographic = False
+        self._new_fast = None
+
+        if fast_algorithm in ('auto', 'blake3'):
+            try:
+                import blake3
+                self.fast_name, self.fast_is_cryptographic, self._new_fast = 'blake3', True, blake3.blake3
+            except ImportError:
+                pass
+        if self._new_fast is None and fast_algorithm == 'xxh3':
+            try:
+                import xxhash
+                self.fast_name, self._new_fast = 'xxh3_128', xxhash.xxh3_128
+            except ImportError:
+                pass
+
+    def new_identity(self):
+        """Incremental identity hasher (for streamed content)"""
+        return hashlib.sha256()
+
+    def identity(self, content):
+        return hashlib.sha256(content).hexdigest()
+
+    def fast(self, content):
+        """Fast pre-hash of content, or None if no fast hash library is installed"""
+        if self._new_fast is None:
+            return None
+        hasher = self._new_fast()
+        hasher.update(content)
+        return hasher.hexdigest()
+
+    def legacy_key(self, identity):
+        return identity[:self.LEGACY_KEY_LENGTH]
+
+
+class AssetIndex:
+    """Asset index stored in SQLite (WAL mode) instead of a JSON file
+
+    Behaves like the old asset_cache dict (content hash -> relative path) and also
+    holds the URL index used for HTTP revalidation. Writes are batched until
+    commit() is called, and lookups never load the whole index into memory.
+    """
+
+    def __init__(self, db_path):
+        self.connection = sqlite3.connect(str(db_path), check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS assets (hash TEXT PRIMARY KEY, path TEXT NOT NULL)"
+        )
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS urls ("
+            "url TEXT PRIMARY KEY, hash TEXT, path TEXT, etag TEXT, last_modified TEXT, expires REAL)"
+        )
+        self.connection.commit()
+
+    def __contains__(self, content_hash):
+        return self.get(content_hash) is not None
+
+    def __getitem__(self, content_hash):
+        path = self.get(content_hash)
+        if path is None:
+            raise KeyError(content_hash)
+        return path
+
+    def __setitem__(self, content_hash, path):
+        self.connection.execute("INSERT OR REPLACE INTO assets (hash, path) VALUES (?, ?)", (content_hash, path))
+
+    def __len__(self):
+        # Legacy and full-length keys can point at the same file
+        return self.connection.execute("SELECT COUNT(DISTINCT path) FROM assets").fetchone()[0]
+
+    def get(self, content_hash, default=None):
+        row = self.connection.execute("SELECT path FROM assets WHERE hash = ?", (content_hash,)).fetchone()
+        return row[0] if row else default
+
+    def get_url(self, url):
+        """URL index entry (hash, path, etag, last_modified, expires) or None"""
+        row = self.connection.execute(
+            "SELECT hash, path, etag, last_modified, expires FROM urls WHERE url = ?", (url,)
+        ).fetchone()
+        if not row:
+            return None
+        return dict(zip(('hash', 'path', 'etag', 'last_modified', 'expires'), row))
+
+    def set_url(self, url, entry):
+        self.connection.execute(
+            "INSERT OR REPLACE INTO urls (url, hash, path, etag, last_modified, expires) VALUES (?, ?, ?, ?, ?, ?)",
+            (url, entry['hash'], entry['path'], entry.get('etag'), entry.get('last_modified'), entry.get('expires'))
+        )
+
+    def items(self):
+        """All (content hash, path) pairs"""
+        return self.connection.execute("SELECT hash, path FROM assets").fetchall()
+
+    def move(self, content_hash, old_path, new_path):
+        """Record that an asset file moved, in both the asset and URL tables"""
+        self.connection.execute("UPDATE assets SET path = ? WHERE hash = ?", (new_path, content_hash))
+        self.connection.execute("UPDATE urls SET path = ? WHERE path = ?", (new_path, old_path))
+
+    def commit(self):
+        self.connection.commit()
+
+    def migrate_json(self, asset_cache_file, url_index_file):
+        """One-time import of the old asset_cache.json / url_index.json files
+
+        Imported files are renamed to *.migrated so they aren't imported again.
+        Returns (assets imported, URLs imported).
+        """
+        imported_assets = imported_urls = 0
+
+        if asset_cache_file.exists():
+            with open(asset_cache_file, 'r') as f:
+                for content_hash, path in json.load(f).items():
+                    self[content_hash] = path
+                    imported_assets += 1
+
+        if url_index_file.exists():
+            with open(url_index_file, 'r') as f:
+                for url, entry in json.load(f).items():
+                    self.set_url(url, entry)
+                    imported_urls += 1
+
+        self.commit()
+
+        for json_file in (asset_cache_file, url_index_file):
+            if json_file.exists():
+                json_file.rename(json_file.with_name(json_file.name + '.migrated'))
+
+        return imported_assets, imported_urls
 
 
 class WebsiteArchiver:
-    def __init__(self, base_url, output_dir="snapshots", enable_internet_archive=False, ia_collection="opensource"):
+    def __init__(self, base_url, output_dir="snapshots", enable_internet_archive=False, ia_collection="opensource",
+                 pool_connections=10, pool_maxsize=10, headers=None, asset_workers=8,
+                 async_fetch=False, max_concurrent_fetches=16, max_fetches_per_host=4,
+                 store_normalized_text=False, full_change_evaluation=False,
+                 incremental=False, stream_assets=False, max_asset_size=None, asset_layout='flat',
+                 fast_hash='auto', verify_fast_hash=None, parser_backend='auto', normalization_rules=None,
+                 cpu_workers=None, cpu_chunk_size=4, diff_max_work=1_000_000, similarity_threshold=None,
+                 rewrite_parser='html.parser'):
         self.base_url = base_url.rstrip('/')
         self.domain = urlparse(base_url).netloc
         self.output_dir = Path(output_dir)
@@ -24,6 +1418,57 @@ class WebsiteArchiver:
         self.snapshots_dir = self.output_dir / self.domain
         self.enable_internet_archive = enable_internet_archive
         self.ia_collection = ia_collection
+        self.asset_workers = asset_workers
+        self.async_fetch = async_fetch
+        self.max_concurrent_fetches = max_concurrent_fetches
+        self.max_fetches_per_host = max_fetches_per_host
+        self.store_normalized_text = store_normalized_text
+        # Incremental snapshots need to know exactly which pages are unchanged
+        self.incremental = incremental
+        self.full_change_evaluation = full_change_evaluation or incremental
+        # Streaming keeps large assets out of memory; max_asset_size (bytes) only applies when streaming
+        self.stream_assets = stream_assets
+        self.max_asset_size = max_asset_size
+        # 'flat' (assets/<type>/) or 'sharded' (assets/ab/cd/) for new assets
+        self.asset_layout = asset_layout
+
+        # Parser used to normalize pages for comparison: 'stream' (html.parser output, normalized
+        # without a tree), 'html.parser', or the opt-in 'selectolax' / 'lxml', which normalize
+        # malformed markup differently; 'auto' = fastest installed one that matches html.parser.
+        self.parser_backend = get_parser_backend(parser_backend)
+        # BeautifulSoup parser the archived pages are rewritten from. Only html.parser keeps
+        # the markup as served; 'lxml' is faster but wraps fragments and re-nests bad markup.
+        if rewrite_parser not in ('html.parser', 'lxml'):
+            raise ValueError(f"Unknown rewrite parser: {rewrite_parser}")
+        if rewrite_parser == 'lxml' and 'lxml' not in installed_parser_backends():
+            raise ImportError("Parser backend lxml is not installed")
+        self.soup_features = rewrite_parser
+        # Noise removed before comparing pages: DEFAULT_NORMALIZATION_RULES, a rule list or a JSON file
+        self.normalizer = NormalizationEngine(normalization_rules)
+        # Stored with every fingerprint - different backends, rules or bs4 releases (whose
+        # serialization and tokenizer callbacks the normalizers mirror) can normalize a page
+        # differently, and a mismatch means re-normalizing the previous page, not a change
+        self.normalizer_id = f"{self.parser_backend}+bs4-{BS4_VERSION}+rules-{self.normalizer.fingerprint}"
+
+        # Worker processes for parsing, normalizing and rewriting pages (None = in this process);
+        # pages are sent to them cpu_chunk_size at a time
+        self.cpu_workers = cpu_workers
+        self.cpu_chunk_size = cpu_chunk_size
+        self.cpu_pool = None
+        # Upper bound on the steps spent aligning one changed page for CHANGES.txt / changes.json
+        # (by the region tree walk and by the text diff, each); past it the rest of the page is
+        # reported as coarse regions and hunks
+        self.diff_max_work = diff_max_work
+        # Changed pages at least this similar (0-1, estimated over shingles of the normalized text)
+        # to their previous version count as insignificant churn and don't trigger a snapshot;
+        # None = any change counts
+        self.similarity_threshold = similarity_threshold
+
+        # Full SHA-256 identifies assets; a fast pre-hash spots repeats within a run.
+        # verify_fast_hash byte-compares a repeat with the stored asset before trusting the match
+        self.hasher = ContentHasher(fast_hash)
+        self.verify_fast_hash = (not self.hasher.fast_is_cryptographic
+                                 if verify_fast_hash is None else verify_fast_hash)
 
         # Create directory structure
         self.assets_dir.mkdir(parents=True, exist_ok=True)
@@ -43,6 +1488,23 @@ class WebsiteArchiver:
         # Track downloaded assets
         self.asset_cache = self._load_asset_cache()
 
+        # Asset URL -> local path for the current snapshot run (None if the download failed)
+        self.snapshot_assets = {}
+        self.asset_fetches_avoided = 0
+        self.assets_fresh = 0
+        self.assets_revalidated = 0
+        # Fast pre-hash -> (SHA-256 identity, size) for content seen in this run
+        self.fast_hashes = {}
+
+        # tag name -> [(attribute, match)] for assets localized by _rewrite_html
+        self.asset_handlers = {}
+        self.register_asset_handler('img', 'src')
+        self.register_asset_handler('link', 'href', match=is_stylesheet_link)
+        self.register_asset_handler('script', 'src')
+
+        # Shared HTTP session so pages and assets reuse keep-alive connections
+        self.session = self._create_session(pool_connections, pool_maxsize, headers)
+
         # Check for internetarchive library if enabled
         if self.enable_internet_archive:
             try:
@@ -53,138 +1515,435 @@ class WebsiteArchiver:
                 self.logger.error("internetarchive library not installed. Run: pip install internetarchive")
                 self.enable_internet_archive = False
 
+    def _create_session(self, pool_connections, pool_maxsize, headers=None):
+        """Create a pooled HTTP session used by every page and asset fetch"""
+        session = requests.Session()
+        session.headers.update(DEFAULT_HEADERS)
+        if headers:
+            session.headers.update(headers)
+
+        # pool_connections = number of hosts kept pooled,
+        # pool_maxsize = max open connections kept per host
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+
     def _load_asset_cache(self):
-        """Load existing asset cache to avoid re-downloading"""
-        cache_file = self.assets_dir / "asset_cache.json"
-        if cache_file.exists():
-            with open(cache_file, 'r') as f:
-                return json.load(f)
-        return {}
-
-    def _save_asset_cache(self):
-        """Save asset cache"""
-        cache_file = self.assets_dir / "asset_cache.json"
-        with open(cache_file, 'w') as f:
-            json.dump(self.asset_cache, f, indent=2)
+        """Open the asset index, migrating the old JSON cache files on first use"""
+        asset_cache = AssetIndex(self.assets_dir / "asset_index.sqlite3")
+
+        asset_cache_file = self.assets_dir / "asset_cache.json"
+        url_index_file = self.assets_dir / "url_index.json"
+        if asset_cache_file.exists() or url_index_file.exists():
+            imported_assets, imported_urls = asset_cache.migrate_json(asset_cache_file, url_index_file)
+            self.logger.info(f"Migrated {imported_assets} assets and {imported_urls} asset URLs "
+                             f"from JSON to {self.assets_dir / 'asset_index.sqlite3'}")
+
+        return asset_cache
+
+    def _get_cache_expiry(self, response):
+        """Work out until when a response can be reused without revalidating (epoch seconds)"""
+        now = time.time()
+        directives = {}
+        for directive in response.headers.get('Cache-Control', '').lower().split(','):
+            name, _, value = directive.strip().partition('=')
+            directives[name] = value.strip('"')
+
+        if 'no-store' in directives or 'no-cache' in directives:
+            return now
+
+        if 'max-age' in directives:
+            try:
+                return now + int(directives['max-age']) - int(response.headers.get('Age', 0))
+            except ValueError:
+                return now
 
-    def _get_file_hash(self, content):
-        """Generate hash for content deduplication"""
-        return hashlib.sha256(content).hexdigest()[:16]
+        expires = response.headers.get('Expires')
+        if expires:
+            try:
+                return parsedate_to_datetime(expires).timestamp()
+            except (TypeError, ValueError):
+                return now
 
-    def _download_asset(self, url):
-        """Download an asset (image, CSS, JS, etc.)"""
+        # No freshness information - always revalidate
+        return now
+
+    def _get_file_hash(self, content):
+        """Generate hash for content deduplication (full-length SHA-256 identity)"""
+        fast_digest = self.hasher.fast(content)
+        if fast_digest is None:
+            return self.hasher.identity(content)
+
+        # Content already seen in this run skips SHA-256 - checked byte for byte against
+        # the stored copy when the fast hash isn't collision resistant
+        known = self.fast_hashes.get(fast_digest)
+        if known and known[1] == len(content):
+            if not self.verify_fast_hash or self._matches_stored_asset(known[0], content):
+                return known[0]
+            identity = self.hasher.identity(content)
+            if identity != known[0]:
+                self.logger.warning(f"{self.hasher.fast_name} collision detected, using SHA-256 identity")
+            return identity
+
+        identity = self.hasher.identity(content)
+        self.fast_hashes[fast_digest] = (identity, len(content))
+        return identity
+
+    def _matches_stored_asset(self, content_hash, content):
+        """Whether the stored asset for content_hash holds exactly these bytes"""
+        path = self._lookup_asset(content_hash)
+        if not path:
+            # Saving the first copy failed, so there is nothing to confirm against
+            return False
         try:
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/131.0.0.0 Safari/537.36'
-            }
-            response = requests.get(url, timeout=10, headers=headers)
+            with open(self.output_dir / path, 'rb') as f:
+                return f.read() == content
+        except OSError:
+            return False
+
+    def _lookup_asset(self, content_hash):
+        """Stored path for a content hash, also finding assets saved under legacy truncated keys"""
+        path = self.asset_cache.get(content_hash)
+        if path is None:
+            path = self.asset_cache.get(self.hasher.legacy_key(content_hash))
+            if path is not None:
+                # Remember the full-length key so the next lookup is direct
+                self.asset_cache[content_hash] = path
+        return path
+
+    def _download_asset(self, url, cache_entry=None):
+        """Download an asset (image, CSS, JS, etc.), revalidating a cached copy if one is given"""
+        try:
+            headers = {}
+            if cache_entry:
+                if cache_entry.get('etag'):
+                    headers['If-None-Match'] = cache_entry['etag']
+                if cache_entry.get('last_modified'):
+                    headers['If-Modified-Since'] = cache_entry['last_modified']
+
+            response = self.session.get(url, timeout=10, headers=headers, stream=self.stream_assets)
             response.raise_for_status()
-            return response.content
+
+            if self.stream_assets and response.status_code != 304:
+                return self._stream_asset_to_disk(url, response)
+            return response
         except Exception as e:
             self.logger.warning(f"Failed to download {url}: {e}")
             return None
 
-    def _save_asset(self, url, content):
-        """Save asset with deduplication"""
-        content_hash = self._get_file_hash(content)
-
-        # Check if we already have this exact file
-        if content_hash in self.asset_cache:
-            self.logger.info(f"Asset already cached: {url}")
-            return self.asset_cache[content_hash]
-
-        # Determine file extension
-        parsed = urlparse(url)
-        ext = os.path.splitext(parsed.path)[1] or '.bin'
-
-        # Determine asset type directory
+    def _stream_asset_to_disk(self, url, response):
+        """Write a streamed response to a temp file in assets/, hashing it on the way
+
+        Sets response.temp_path and response.content_hash, or returns None if the
+        Content-Length header already exceeds max_asset_size. Raises ValueError,
+        after removing the temp file, if the body turns out empty or larger than
+        that; _download_asset logs it and treats the asset as failed.
+        """
+        with response:
+            content_length = response.headers.get('Content-Length')
+            if self.max_asset_size and content_length and content_length.isdigit() \
+                    and int(content_length) > self.max_asset_size:
+                self.logger.warning(f"Skipping {url}: {content_length} bytes exceeds max_asset_size")
+                return None
+
+            hasher = self.hasher.new_identity()
+            size = 0
+            temp_file = tempfile.NamedTemporaryFile(dir=self.assets_dir, prefix='.download_', delete=False)
+            try:
+                with temp_file:
+                    for chunk in response.iter_content(chunk_size=64 * 1024):
+                        size += len(chunk)
+                        if self.max_asset_size and size > self.max_asset_size:
+                            raise ValueError(f"download exceeds max_asset_size ({self.max_asset_size} bytes)")
+                        hasher.update(chunk)
+                        temp_file.write(chunk)
+
+                if size == 0:
+                    raise ValueError("empty response")
+            except Exception:
+                os.unlink(temp_file.name)
+                raise
+
+        response.temp_path = Path(temp_file.name)
+        response.content_hash = hasher.hexdigest()
+        return response
+
+    def _get_asset_type(self, ext):
+        """Asset type directory for a file extension (used by the flat layout)"""
         if ext in ['.jpg', '.jpeg', '.png', '.gif', '.svg', '.webp', '.ico']:
-            asset_type = 'images'
+            return 'images'
         elif ext in ['.css']:
-            asset_type = 'css'
+            return 'css'
         elif ext in ['.js']:
-            asset_type = 'js'
+            return 'js'
         elif ext in ['.woff', '.woff2', '.ttf', '.eot']:
-            asset_type = 'fonts'
-        else:
-            asset_type = 'other'
+            return 'fonts'
+        return 'other'
+
+    def _layout_asset_path(self, content_hash, ext, layout=None):
+        """Relative path (under output_dir) for an asset in the given store layout
+
+        flat:    assets/<type>/<hash><ext>
+        sharded: assets/<hash[0:2]>/<hash[2:4]>/<hash><ext>
+        """
+        layout = layout or self.asset_layout
+        if layout == 'sharded':
+            return f"assets/{content_hash[0:2]}/{content_hash[2:4]}/{content_hash}{ext}"
+        return f"assets/{self._get_asset_type(ext)}/{content_hash}{ext}"
+
+    def _get_asset_path(self, url, content_hash):
+        """Relative path (under output_dir) where an asset with this hash is stored"""
+        # Determine file extension
+        parsed = urlparse(url)
+        ext = os.path.splitext(parsed.path)[1] or '.bin'
+
+        return self._layout_asset_path(content_hash, ext)
 
-        # Create subdirectory
-        asset_dir = self.assets_dir / asset_type
-        asset_dir.mkdir(exist_ok=True)
+    def migrate_asset_layout(self, layout='sharded'):
+        """Move every stored asset to another layout ('flat' or 'sharded')
 
-        # Save with hash-based filename
-        filename = f"{content_hash}{ext}"
-        filepath = asset_dir / filename
+        Updates the asset index, the assets lists in every snapshot manifest and
+        the asset links inside every archived page, then switches this archiver
+        to the new layout.
+        """
+        self.logger.info(f"Migrating asset store to {layout} layout...")
+
+        # Move files and update the index
+        moved = {}
+        for content_hash, old_path in self.asset_cache.items():
+            # Files keep their name (legacy assets are named by a truncated hash)
+            file_hash, ext = os.path.splitext(os.path.basename(old_path))
+            new_path = self._layout_asset_path(file_hash, ext, layout)
+            if new_path == old_path:
+                continue
+
+            old_file = self.output_dir / old_path
+            new_file = self.output_dir / new_path
+            if old_file.exists():
+                new_file.parent.mkdir(parents=True, exist_ok=True)
+                os.replace(old_file, new_file)
+                # Drop directories the move left empty (stops at the first non-empty one)
+                try:
+                    os.removedirs(old_file.parent)
+                except OSError:
+                    pass
+
+            self.asset_cache.move(content_hash, old_path, new_path)
+            moved[old_path] = new_path
+        self.asset_cache.commit()
+
+        # Point existing snapshots at the new locations
+        asset_link = re.compile(r'\.\./\.\./(assets/[^"\'\s)]+)')
+        for snapshot in sorted(d for d in self.snapshots_dir.iterdir() if d.is_dir()):
+            manifest_file = snapshot / 'manifest.json'
+            if not manifest_file.exists():
+                continue
+
+            with open(manifest_file, 'r') as f:
+                manifest = json.load(f)
+
+            for page in manifest['pages']:
+                if page['status'] != 'success':
+                    continue
+                page['assets'] = [moved.get(asset_path, asset_path) for asset_path in page.get('assets', [])]
+
+                # Pages hard-linked between snapshots are rewritten once for all of them
+                html_file = snapshot / page['file']
+                if html_file.exists():
+                    with open(html_file, 'r', encoding='utf-8') as f:
+                        html = f.read()
+                    rewritten = asset_link.sub(lambda m: f"../../{moved.get(m.group(1), m.group(1))}", html)
+                    if rewritten != html:
+                        with open(html_file, 'w', encoding='utf-8') as f:
+                            f.write(rewritten)
+
+            with open(manifest_file, 'w') as f:
+                json.dump(manifest, f, indent=2)
+
+        self.asset_layout = layout
+        self.logger.info(f"Moved {len(moved)} assets to the {layout} layout")
+        return len(moved)
+
+    def _save_asset(self, url, content, content_hash=None):
+        """Save asset with deduplication"""
+        content_hash = content_hash or self._get_file_hash(content)
+
+        # Check if we already have this exact file
+        cached_path = self._lookup_asset(content_hash)
+        if cached_path:
+            self.logger.info(f"Asset already cached: {url}")
+            return cached_path
+
+        relative_path = self._get_asset_path(url, content_hash)
+        filepath = self.output_dir / relative_path
+        filepath.parent.mkdir(parents=True, exist_ok=True)
 
         with open(filepath, 'wb') as f:
             f.write(content)
 
         # Update cache
-        relative_path = f"assets/{asset_type}/{filename}"
         self.asset_cache[content_hash] = relative_path
-        self._save_asset_cache()
 
         self.logger.info(f"Saved new asset: {relative_path}")
         return relative_path
 
-    def _rewrite_html(self, html, page_url, snapshot_dir):
-        """Rewrite HTML to use local assets"""
-        soup = BeautifulSoup(html, 'html.parser')
+    def _save_asset_file(self, url, temp_path, content_hash):
+        """Save an asset streamed to a temp file, moving it to its content-addressed name"""
+        # Check if we already have this exact file
+        cached_path = self._lookup_asset(content_hash)
+        if cached_path:
+            self.logger.info(f"Asset already cached: {url}")
+            temp_path.unlink()
+            return cached_path
+
+        relative_path = self._get_asset_path(url, content_hash)
+        filepath = self.output_dir / relative_path
+        filepath.parent.mkdir(parents=True, exist_ok=True)
+
+        # Same filesystem as the temp file, so the rename is atomic
+        os.replace(temp_path, filepath)
+
+        # Update cache
+        self.asset_cache[content_hash] = relative_path
+
+        self.logger.info(f"Saved new asset: {relative_path}")
+        return relative_path
+
+    def _download_assets(self, cache_entries):
+        """Download a batch of assets in parallel, returning {url: response or None}"""
+        urls = list(cache_entries)
+
+        if self.asset_workers <= 1 or len(urls) <= 1:
+            return {url: self._download_asset(url, cache_entries[url]) for url in urls}
+
+        with ThreadPoolExecutor(max_workers=self.asset_workers) as executor:
+            responses = executor.map(self._download_asset, urls, [cache_entries[url] for url in urls])
+            return dict(zip(urls, responses))
+
+    def _resolve_assets(self, asset_urls):
+        """Make sure every asset URL has a local copy, recording it in self.snapshot_assets"""
+        # Fetch each distinct asset URL at most once per snapshot
+        new_urls = [url for url in dict.fromkeys(asset_urls) if url not in self.snapshot_assets]
+        self.asset_fetches_avoided += len(asset_urls) - len(new_urls)
+
+        # Assets still fresh according to their HTTP cache headers skip the network entirely
+        now = time.time()
+        to_fetch = {}
+        for asset_url in new_urls:
+            entry = self.asset_cache.get_url(asset_url)
+            if entry and not (self.output_dir / entry['path']).exists():
+                entry = None
+
+            if entry and entry.get('expires', 0) > now:
+                self.snapshot_assets[asset_url] = entry['path']
+                self.assets_fresh += 1
+            else:
+                to_fetch[asset_url] = entry
+
+        # Everything else is downloaded concurrently (conditionally if we have validators)
+        downloaded = self._download_assets(to_fetch)
+
+        for asset_url, entry in to_fetch.items():
+            response = downloaded[asset_url]
+            if response is not None and response.status_code == 304 and entry:
+                local_path = entry['path']
+                content_hash = entry['hash']
+                self.assets_revalidated += 1
+            elif response is not None and getattr(response, 'temp_path', None):
+                # Streamed to disk and already hashed by the download worker
+                content_hash = response.content_hash
+                local_path = self._save_asset_file(asset_url, response.temp_path, content_hash)
+            elif response is not None and not self.stream_assets and response.content:
+                content_hash = self._get_file_hash(response.content)
+                local_path = self._save_asset(asset_url, response.content, content_hash)
+            else:
+                # Failed downloads are remembered too so they aren't retried for every tag
+                self.snapshot_assets[asset_url] = None
+                continue
+
+            self.snapshot_assets[asset_url] = local_path
+            previous = entry or {}
+            self.asset_cache.set_url(asset_url, {
+                'hash': content_hash,
+                'path': local_path,
+                'etag': response.headers.get('ETag', previous.get('etag')),
+                'last_modified': response.headers.get('Last-Modified', previous.get('last_modified')),
+                'expires': self._get_cache_expiry(response)
+            })
+
+    def register_asset_handler(self, tag_name, attribute, match=None):
+        """Download and localize the URL in `attribute` of `tag_name` tags when rewriting pages
+
+        tag_name may be '*' for any tag. match is an optional callable(tag) -> bool
+        for extra conditions (e.g. rel="stylesheet"). Handlers are dispatched during
+        the single tree walk in _rewrite_html, so adding one costs no extra scan.
+        With cpu_workers, match is sent to the worker processes, so it has to be a
+        module-level function rather than a lambda.
+        """
+        self.asset_handlers.setdefault(tag_name, []).append((attribute, match))
+
+    def _rewrite_html(self, page, page_url, snapshot_dir):
+        """Rewrite a ParsedPage to use local assets"""
+        soup = page.soup
         assets_used = []
 
-        # Process images
-        for tag in soup.find_all('img'):
-            if tag.get('src'):
-                asset_url = urljoin(page_url, tag['src'])
-                content = self._download_asset(asset_url)
-                if content:
-                    local_path = self._save_asset(asset_url, content)
-                    # Calculate relative path from snapshot to assets
-                    tag['src'] = f"../../{local_path}"
-                    assets_used.append(local_path)
-
-        # Process CSS links
-        for tag in soup.find_all('link', rel='stylesheet'):
-            if tag.get('href'):
-                asset_url = urljoin(page_url, tag['href'])
-                content = self._download_asset(asset_url)
-                if content:
-                    local_path = self._save_asset(asset_url, content)
-                    tag['href'] = f"../../{local_path}"
-                    assets_used.append(local_path)
+        # First pass: one walk over the tree collects every asset reference
+        asset_refs, inline_style_urls = collect_asset_refs(soup, page_url, self.asset_handlers)
+        for _ in range(inline_style_urls):
+            self.logger.warning(f"Inline style with URL found, may need manual handling")
+
+        # Download (or reuse) every referenced asset, committing the index once per page
+        self._resolve_assets([asset_url for _, _, asset_url in asset_refs])
+        self.asset_cache.commit()
+
+        # Second pass: new link for each localized (tag, attribute), in document order
+        local_links = {}
+        for tag, attr, asset_url in asset_refs:
+            local_path = self.snapshot_assets[asset_url]
+            if local_path:
+                # Calculate relative path from snapshot to assets
+                local_links[(id(tag), attr)] = f"../../{local_path}"
+                assets_used.append(local_path)
 
-        # Process inline styles with URLs
-        for tag in soup.find_all(style=True):
-            style = tag['style']
-            # Simple URL extraction from CSS (could be improved)
-            if 'url(' in style:
-                self.logger.warning(f"Inline style with URL found, may need manual handling")
-
-        # Process scripts
-        for tag in soup.find_all('script', src=True):
-            asset_url = urljoin(page_url, tag['src'])
-            content = self._download_asset(asset_url)
-            if content:
-                local_path = self._save_asset(asset_url, content)
-                tag['src'] = f"../../{local_path}"
+        # The shared tree is left as parsed; links are swapped in while serializing
+        formatter = AttributeRewritingFormatter(
+            lambda tag, name, value: local_links.get((id(tag), name), value)
+        )
+        return soup.decode(formatter=formatter), assets_used
+
+    def _finish_prepared_rewrite(self, template, refs, inline_style_urls):
+        """Download the assets of a page prepared by _prepare_rewrite_in_worker and fill in its links"""
+        for _ in range(inline_style_urls):
+            self.logger.warning(f"Inline style with URL found, may need manual handling")
+
+        # Assets are saved here in the parent, so the store is never written concurrently
+        self._resolve_assets([asset_url for asset_url, _ in refs])
+        self.asset_cache.commit()
+
+        assets_used = []
+        values = []
+        for asset_url, original in refs:
+            local_path = self.snapshot_assets[asset_url]
+            if local_path:
+                values.append(f"../../{local_path}")
                 assets_used.append(local_path)
+            else:
+                values.append(original)
 
-        return str(soup), assets_used
+        html = ASSET_PLACEHOLDER_PATTERN.sub(lambda match: quote_soup_attribute(values[int(match.group(1))]), template)
+        return html, assets_used
 
     def _archive_page(self, url, snapshot_dir):
         """Archive a single page"""
         try:
             self.logger.info(f"Archiving: {url}")
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/131.0.0.0 Safari/537.36'
-            }
-            response = requests.get(url, timeout=15, headers=headers)
+            response = self.session.get(url, timeout=15)
             response.raise_for_status()
 
             # Rewrite HTML and download assets
             rewritten_html, assets_used = self._rewrite_html(
-                response.text, url, snapshot_dir
+                ParsedPage(response.text, self.soup_features), url, snapshot_dir
             )
 
             # Generate filename from URL path
@@ -213,50 +1972,194 @@ class WebsiteArchiver:
                 'error': str(e)
             }
 
+    def _fetch_page(self, page_url, previous_page=None):
+        """Fetch a page for change detection, returning a temp page record
+
+        If the previous snapshot stored HTTP validators for this page, the request is
+        conditional and a 304 answer marks the page as not modified without a body.
+        """
+        try:
+            self.logger.info(f"Checking: {page_url}")
+            headers = {}
+            if previous_page:
+                if previous_page.get('etag'):
+                    headers['If-None-Match'] = previous_page['etag']
+                if previous_page.get('last_modified'):
+                    headers['If-Modified-Since'] = previous_page['last_modified']
+
+            response = self.session.get(page_url, timeout=15, headers=headers)
+            response.raise_for_status()
+
+            if response.status_code == 304 and previous_page:
+                self.logger.info(f"Not modified since previous snapshot: {page_url}")
+                return {
+                    'url': page_url,
+                    'not_modified': True,
+                    'etag': response.headers.get('ETag', previous_page.get('etag')),
+                    'last_modified': response.headers.get('Last-Modified', previous_page.get('last_modified')),
+                    'status': 'success'
+                }
+
+            # Store temporarily for comparison
+            return {
+                'url': page_url,
+                'html': response.text,
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+                'status': 'success'
+            }
+        except Exception as e:
+            self.logger.error(f"Failed to fetch {page_url}: {e}")
+            return {
+                'url': page_url,
+                'status': 'failed',
+                'error': str(e)
+            }
+
+    def _get_conditional_pages(self, comparison):
+        """Map URL -> previous manifest entry for pages that can be fetched conditionally"""
+        previous_snapshot = comparison['previous_snapshot']
+
+        # A 304 is only useful if we still have the original HTML it refers to
+        conditional_pages = {}
+        for url, page in comparison['previous_pages'].items():
+            if 'original_file' not in page:
+                continue
+            if not (page.get('etag') or page.get('last_modified')):
+                continue
+            if (previous_snapshot / page['original_file']).exists():
+                conditional_pages[url] = dict(page, snapshot_dir=previous_snapshot)
+        return conditional_pages
+
+    async def _fetch_pages_async(self, page_urls, previous_pages):
+        """Fetch pages concurrently, capped overall and per host, preserving input order"""
+        loop = asyncio.get_running_loop()
+        total_limit = asyncio.Semaphore(self.max_concurrent_fetches)
+        host_limits = {}
+
+        async def fetch(page_url):
+            host = urlparse(page_url).netloc
+            host_limit = host_limits.setdefault(host, asyncio.Semaphore(self.max_fetches_per_host))
+            # Take the per-host slot first so a busy host doesn't hold global slots
+            async with host_limit:
+                async with total_limit:
+                    return await loop.run_in_executor(
+                        executor, self._fetch_page, page_url, previous_pages.get(page_url)
+                    )
+
+        # Blocking session calls run on a dedicated pool sized to the concurrency cap
+        with ThreadPoolExecutor(max_workers=self.max_concurrent_fetches) as executor:
+            return await asyncio.gather(*(fetch(page_url) for page_url in page_urls))
+
     def snapshot(self, pages_to_archive=None):
         """Create a complete snapshot of the website"""
+        if not self.cpu_workers or self.cpu_workers < 2:
+            return self._snapshot(pages_to_archive)
+
+        # CPU-bound page work goes to worker processes for the length of the run
+        worker_config = (self.parser_backend, self.soup_features, self.normalizer.rules, self.asset_handlers,
+                         self.similarity_threshold is not None)
+        with ProcessPoolExecutor(max_workers=self.cpu_workers, initializer=_init_page_worker,
+                                 initargs=worker_config) as self.cpu_pool:
+            try:
+                return self._snapshot(pages_to_archive)
+            finally:
+                self.cpu_pool = None
+
+    def _summarize_pages(self, temp_pages):
+        """Fingerprint every downloaded page in the worker processes (see _summarize_page)"""
+        pages = [temp_page for temp_page in temp_pages
+                 if temp_page['status'] == 'success' and 'html' in temp_page and 'normalized_hash' not in temp_page]
+        results = self.cpu_pool.map(_summarize_in_worker, [temp_page['html'] for temp_page in pages],
+                                    chunksize=self.cpu_chunk_size)
+
+        for temp_page, (summary, hits, timings) in zip(pages, results):
+            temp_page.update(summary)
+            for name, count in hits.items():
+                self.normalizer.hits[name] = self.normalizer.hits.get(name, 0) + count
+            for label, seconds in timings.items():
+                self.normalizer.timings[label] = self.normalizer.timings.get(label, 0.0) + seconds
+        self.logger.info(f"Normalized {len(pages)} pages in {self.cpu_workers} worker processes")
+
+    def _prepare_rewrites(self, temp_pages, comparison):
+        """Parse and serialize every page that will be rewritten in the worker processes
+
+        Returns {id(temp_page): prepared} for _finish_prepared_rewrite.
+        """
+        pages = []
+        for temp_page in temp_pages:
+            if temp_page['status'] != 'success':
+                continue
+            result = comparison['pages'].get(temp_page['url'])
+            if self.full_change_evaluation and result and result['status'] == 'unchanged':
+                continue  # Reused from the previous snapshot instead
+            pages.append(temp_page)
+
+        results = self.cpu_pool.map(_prepare_rewrite_in_worker,
+                                    [(self._get_html(temp_page), temp_page['url']) for temp_page in pages],
+                                    chunksize=self.cpu_chunk_size)
+        return {id(temp_page): prepared for temp_page, prepared in zip(pages, results)}
+
+    def _snapshot(self, pages_to_archive):
+        """Body of snapshot(), with or without worker processes"""
         timestamp = datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
 
         self.logger.info(f"Starting snapshot check: {timestamp}")
 
+        # Asset URLs are only deduplicated within a single snapshot run
+        self.snapshot_assets = {}
+        self.asset_fetches_avoided = 0
+        self.assets_fresh = 0
+        self.assets_revalidated = 0
+        # Fast pre-hash -> (SHA-256 identity, size) for content seen in this run
+        self.fast_hashes = {}
+        self.normalizer.reset_stats()
+
         # Default to just the homepage if no pages specified
         if pages_to_archive is None:
             pages_to_archive = [self.base_url]
 
+        # Ensure full URLs
+        page_urls = [
+            page_url if page_url.startswith('http') else urljoin(self.base_url, page_url)
+            for page_url in pages_to_archive
+        ]
+
+        # Everything this run is compared against comes from the most recent snapshot
+        comparison = self._load_comparison_baseline()
+
+        # Pages with stored validators are fetched conditionally
+        previous_pages = self._get_conditional_pages(comparison)
+
         # First, download and check for changes WITHOUT saving yet
-        temp_pages = []
-        for page_url in pages_to_archive:
-            # Ensure full URL
-            if not page_url.startswith('http'):
-                page_url = urljoin(self.base_url, page_url)
+        if self.async_fetch:
+            temp_pages = asyncio.run(self._fetch_pages_async(page_urls, previous_pages))
+        else:
+            temp_pages = [self._fetch_page(page_url, previous_pages.get(page_url)) for page_url in page_urls]
 
-            try:
-                self.logger.info(f"Checking: {page_url}")
-                headers = {
-                    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/131.0.0.0 Safari/537.36'
-                }
-                response = requests.get(page_url, timeout=15, headers=headers)
-                response.raise_for_status()
+        # Not-modified pages reuse the previous snapshot's original HTML
+        for temp_page in temp_pages:
+            if temp_page.get('not_modified'):
+                previous_page = previous_pages[temp_page['url']]
+                temp_page['previous_file'] = previous_page['snapshot_dir'] / previous_page['original_file']
+                # Same body as last time, so the stored fingerprint still applies
+                if self._has_usable_fingerprint(previous_page):
+                    temp_page['normalized_hash'] = previous_page['normalized_hash']
+                    temp_page['normalized_length'] = previous_page['normalized_length']
 
-                # Store temporarily for comparison
-                temp_pages.append({
-                    'url': page_url,
-                    'html': response.text,
-                    'status': 'success'
-                })
-            except Exception as e:
-                self.logger.error(f"Failed to fetch {page_url}: {e}")
-                temp_pages.append({
-                    'url': page_url,
-                    'status': 'failed',
-                    'error': str(e)
-                })
+        if self.cpu_pool:
+            self._summarize_pages(temp_pages)
+
+        # Optionally classify every page up front, so unchanged ones can reuse previous outputs
+        if self.full_change_evaluation and comparison['previous_manifest']:
+            self._compare_all_pages(temp_pages, comparison)
 
         # Check if content has changed compared to previous snapshot
-        if not self._has_content_changed_from_temp(temp_pages):
+        if not self._has_content_changed_from_temp(temp_pages, comparison):
             self.logger.info("=" * 60)
             self.logger.info("NO CHANGES DETECTED - Skipping snapshot creation")
             self.logger.info("=" * 60)
+            self._log_normalization_stats()
             return None
 
         # Content has changed, proceed with full snapshot
@@ -274,12 +2177,34 @@ class WebsiteArchiver:
             'pages': []
         }
 
+        prepared_pages = self._prepare_rewrites(temp_pages, comparison) if self.cpu_pool else {}
+
+        # URL -> Merkle tree of the normalized page, saved next to the manifest
+        merkle_trees = {}
+
+        pages_reused = 0
         for temp_page in temp_pages:
             if temp_page['status'] == 'success':
+                # Pages known to be unchanged keep the previous snapshot's files as they are
+                result = comparison['pages'].get(temp_page['url'])
+                if self.full_change_evaluation and result and result['status'] == 'unchanged':
+                    page_entry = self._reuse_previous_page(temp_page, comparison, snapshot_dir)
+                    if page_entry:
+                        manifest['pages'].append(page_entry)
+                        pages_reused += 1
+                        merkle_trees[temp_page['url']] = self._get_merkle_tree(temp_page, comparison)
+                        continue
+
+                # A 304 body wasn't downloaded - it's the same as last time
+                self._get_html(temp_page)
+
                 # Rewrite HTML and download assets
-                rewritten_html, assets_used = self._rewrite_html(
-                    temp_page['html'], temp_page['url'], snapshot_dir
-                )
+                if id(temp_page) in prepared_pages:
+                    rewritten_html, assets_used = self._finish_prepared_rewrite(*prepared_pages.pop(id(temp_page)))
+                else:
+                    rewritten_html, assets_used = self._rewrite_html(
+                        self._get_parsed(temp_page), temp_page['url'], snapshot_dir
+                    )
 
                 # Generate filename from URL path
                 parsed = urlparse(temp_page['url'])
@@ -297,13 +2222,32 @@ class WebsiteArchiver:
                 with open(original_file, 'w', encoding='utf-8') as f:
                     f.write(temp_page['html'])
 
-                manifest['pages'].append({
+                page_entry = {
                     'url': temp_page['url'],
                     'file': str(path),
                     'original_file': str(original_file.name),
                     'assets': assets_used,
+                    'etag': temp_page.get('etag'),
+                    'last_modified': temp_page.get('last_modified'),
+                    # Fingerprint of the normalized content, so the next run doesn't re-normalize this page
+                    'normalized_hash': self._get_fingerprint(temp_page),
+                    'normalizer': self.normalizer_id,
+                    'normalized_length': temp_page['normalized_length'],
+                    'content_snapshot': timestamp,
                     'status': 'success'
-                })
+                }
+
+                if self.store_normalized_text:
+                    normalized_file = snapshot_dir / (path.replace('.html', '_normalized.txt.gz'))
+                    with gzip.open(normalized_file, 'wt', encoding='utf-8') as f:
+                        f.write(self._get_normalized(temp_page))
+                    page_entry['normalized_file'] = str(normalized_file.name)
+
+                if self.similarity_threshold is not None:
+                    page_entry['similarity_sketch'] = self._get_similarity_sketch(temp_page, comparison)
+
+                merkle_trees[temp_page['url']] = self._get_merkle_tree(temp_page, comparison)
+                manifest['pages'].append(page_entry)
             else:
                 manifest['pages'].append({
                     'url': temp_page['url'],
@@ -316,12 +2260,27 @@ class WebsiteArchiver:
         with open(manifest_file, 'w') as f:
             json.dump(manifest, f, indent=2)
 
+        # Compact JSON - the next run compares against these trees without re-parsing old pages.
+        # Written to a temp file first, so an interrupted run never leaves half a file behind.
+        merkle_file = snapshot_dir / 'merkle.json.gz'
+        temp_merkle_file = snapshot_dir / '.merkle.json.gz.tmp'
+        with gzip.open(temp_merkle_file, 'wt', encoding='utf-8') as f:
+            json.dump({'normalizer': self.normalizer_id, 'format': MERKLE_FORMAT, 'pages': merkle_trees},
+                      f, separators=(',', ':'))
+        os.replace(temp_merkle_file, merkle_file)
+
         # Generate change summary
-        change_summary = self._generate_change_summary(snapshot_dir, temp_pages)
+        change_summary = self._generate_change_summary(snapshot_dir, temp_pages, comparison)
 
         self.logger.info(f"Snapshot complete: {timestamp}")
         self.logger.info(f"Archived {len(manifest['pages'])} pages")
+        if self.full_change_evaluation:
+            self.logger.info(f"Reused {pages_reused} unchanged pages from previous snapshot")
         self.logger.info(f"Total unique assets: {len(self.asset_cache)}")
+        self.logger.info(f"Asset fetches avoided by URL deduplication: {self.asset_fetches_avoided}")
+        self.logger.info(f"Assets still fresh (no request): {self.assets_fresh}, "
+                         f"revalidated (304 Not Modified): {self.assets_revalidated}")
+        self._log_normalization_stats()
 
         # Upload to Internet Archive if enabled
         if self.enable_internet_archive:
@@ -372,10 +2331,11 @@ class WebsiteArchiver:
         # Copy manifest
         shutil.copy2(snapshot_dir / 'manifest.json', bundle_path / 'manifest.json')
 
-        # Copy CHANGES.txt if it exists
-        changes_file = snapshot_dir / 'CHANGES.txt'
-        if changes_file.exists():
-            shutil.copy2(changes_file, bundle_path / 'CHANGES.txt')
+        # Copy CHANGES.txt and changes.json if they exist
+        for name in ('CHANGES.txt', 'changes.json'):
+            changes_file = snapshot_dir / name
+            if changes_file.exists():
+                shutil.copy2(changes_file, bundle_path / name)
 
         # Add README
         readme_content = f"""# Website Archive: {self.domain}
@@ -391,6 +2351,7 @@ Source: {self.base_url}
 - {len(manifest['pages'])} pages archived
 - {len(assets_used)} unique assets included
 - CHANGES.txt - Summary of what changed since last snapshot
+- changes.json - The same changes in machine-readable form
 
 ## About this archive:
 This archive was created for accountability and research purposes.
@@ -407,54 +2368,332 @@ See CHANGES.txt for details on what changed compared to the previous snapshot.
 
     def _normalize_html_for_comparison(self, html):
         """Normalize HTML by removing dynamic elements that don't represent real changes"""
-        from bs4 import BeautifulSoup
-        import re
-
-        # First pass through BeautifulSoup to normalize tag formatting
-        soup = BeautifulSoup(html, 'html.parser')
-
-        # Remove tracking parameters from URLs
-        for tag in soup.find_all(['a', 'link', 'script', 'img'], href=True):
-            href = tag.get('href', '')
-            # Remove common tracking parameters
-            href = re.sub(r'\?_gl=[^"\'>\s]+', '', href)
-            href = re.sub(r'&_gl=[^"\'>\s]+', '', href)
-            href = re.sub(r'\?_ga=[^"\'>\s]+', '', href)
-            href = re.sub(r'&_ga=[^"\'>\s]+', '', href)
-            tag['href'] = href
-
-        for tag in soup.find_all(['img', 'script'], src=True):
-            src = tag.get('src', '')
-            src = re.sub(r'\?_gl=[^"\'>\s]+', '', src)
-            src = re.sub(r'&_gl=[^"\'>\s]+', '', src)
-            src = re.sub(r'\?_ga=[^"\'>\s]+', '', src)
-            src = re.sub(r'&_ga=[^"\'>\s]+', '', src)
-            tag['src'] = src
-
-        # Convert back to string (this normalizes all tag formatting)
-        text = str(soup)
-
-        # Remove Cloudflare challenge parameters (change on every request)
-        text = re.sub(r"window\.__CF\$cv\$params=\{[^}]+\}", "window.__CF$cv$params={[REMOVED]}", text)
-        text = re.sub(r"r:'[a-f0-9]+'", "r:'[REMOVED]'", text)
-        text = re.sub(r"t:'[A-Za-z0-9+/=]+'", "t:'[REMOVED]'", text)
-
-        # Remove relative time indicators (like "5 days ago", "19 h.")
-        # These update constantly but don't represent content changes
-        text = re.sub(r'\d+\s*(h\.|hours?|mins?|minutes?|days?|weeks?|months?)\s*(ago)?\.?', '[TIME]', text,
-                      flags=re.IGNORECASE)
-
-        # Remove Facebook pixel tracking
-        text = re.sub(r'<img[^>]*facebook\.com/tr[^>]*>', '', text)
-
-        # Normalize whitespace
-        text = ' '.join(text.split())
+        return self._normalize_parsed(ParsedPage(html, self.soup_features))
+
+    def _normalize_parsed(self, page):
+        """Normalize a ParsedPage for comparison, leaving its trees untouched"""
+        return normalize_parsed_page(page, self.parser_backend, self.normalizer)
+
+    def _log_normalization_stats(self):
+        """Log per-rule hits and per-pass time spent normalizing during this run"""
+        for label, seconds in self.normalizer.timings.items():
+            self.logger.debug(f"Normalization pass {label}: {seconds * 1000:.1f} ms")
+        hits = ', '.join(f"{name}={count}" for name, count in self.normalizer.hits.items())
+        self.logger.debug(f"Normalization rule hits: {hits}")
+
+    def _get_parsed(self, temp_page):
+        """ParsedPage for a fetched page, shared by every stage of the run"""
+        if 'parsed' not in temp_page:
+            temp_page['parsed'] = ParsedPage(self._get_html(temp_page), self.soup_features)
+        return temp_page['parsed']
+
+    def _get_normalized(self, temp_page):
+        """Normalized text of a fetched page, computed at most once per run"""
+        if 'normalized' not in temp_page:
+            temp_page['normalized'] = self._normalize_parsed(self._get_parsed(temp_page))
+        return temp_page['normalized']
+
+    def _get_html(self, temp_page):
+        """HTML of a fetched page; a 304 page's body is the previous snapshot's original HTML"""
+        if 'html' not in temp_page:
+            with open(temp_page['previous_file'], 'r', encoding='utf-8') as f:
+                temp_page['html'] = f.read()
+        return temp_page['html']
+
+    def _summarize_page(self, temp_page):
+        """Fingerprint, length, Merkle tree and similarity sketch of a fetched page, from one normalization pass"""
+        sketch = self.similarity_threshold is not None
+        if self.parser_backend == 'stream' and 'normalized' not in temp_page:
+            # Consume the normalized text as it's produced, without ever holding all of it
+            html = self._get_html(temp_page)
+            temp_page.update(summarize_normalized(
+                lambda write: StreamingNormalizer(self.normalizer, write).feed(html), sketch))
+        else:
+            normalized = self._get_normalized(temp_page)
+            temp_page.update(summarize_normalized(lambda write: write(normalized), sketch))
+
+    def _get_fingerprint(self, temp_page):
+        """SHA-256 of a fetched page's normalized text, computed at most once per run"""
+        if 'normalized_hash' not in temp_page:
+            self._summarize_page(temp_page)
+        return temp_page['normalized_hash']
+
+    def _get_merkle_tree(self, temp_page, comparison):
+        """Merkle tree of a fetched page's normalized text, built at most once per run"""
+        if 'merkle' in temp_page:
+            return temp_page['merkle']
+
+        previous_tree = comparison['previous_merkle'].get(temp_page['url'])
+        result = comparison['pages'].get(temp_page['url'])
+        if previous_tree and (temp_page.get('not_modified') or (result and result['status'] == 'unchanged')):
+            # Same normalized content as last time
+            temp_page['merkle'] = previous_tree
+        else:
+            self._summarize_page(temp_page)
+        return temp_page['merkle']
+
+    def _get_similarity_sketch(self, temp_page, comparison):
+        """Similarity sketch of a fetched page's normalized text, computed at most once per run"""
+        if 'similarity_sketch' in temp_page:
+            return temp_page['similarity_sketch']
+
+        prev_page = comparison['previous_pages'].get(temp_page['url'])
+        if (temp_page.get('not_modified') and prev_page and 'similarity_sketch' in prev_page
+                and self._has_usable_fingerprint(prev_page)):
+            # Same body as last time
+            temp_page['similarity_sketch'] = prev_page['similarity_sketch']
+        else:
+            self._summarize_page(temp_page)
+        return temp_page['similarity_sketch']
+
+    def _has_usable_fingerprint(self, prev_page):
+        """Whether a previous page's stored fingerprint was made by the normalizer in use"""
+        # Snapshots from before the normalizer was recorded all used html.parser
+        return 'normalized_hash' in prev_page and prev_page.get('normalizer', 'html.parser') == self.normalizer_id
+
+    def _load_previous_normalized(self, previous_snapshot, prev_page):
+        """Normalized text of a previous snapshot's page, or None if its HTML is gone"""
+        # Stored compressed at snapshot time when store_normalized_text is enabled
+        if 'normalized_file' in prev_page and self._has_usable_fingerprint(prev_page):
+            normalized_file = previous_snapshot / prev_page['normalized_file']
+            if normalized_file.exists():
+                with gzip.open(normalized_file, 'rt', encoding='utf-8') as f:
+                    return f.read()
+
+        # Load previous HTML (use original if available, otherwise rewritten)
+        if 'original_file' in prev_page:
+            prev_html_file = previous_snapshot / prev_page['original_file']
+        else:
+            # Fallback for older snapshots without original files
+            prev_html_file = previous_snapshot / prev_page['file']
 
-        return text
+        if not prev_html_file.exists():
+            return None
+
+        with open(prev_html_file, 'r', encoding='utf-8') as f:
+            return self._normalize_html_for_comparison(f.read())
+
+    def _load_comparison_baseline(self):
+        """Load what the current run is compared against (shared by change detection and CHANGES.txt)
+
+        Per-page results are filled in lazily by _compare_page and cached in
+        comparison['pages'], so each page is only ever compared once per run.
+        """
+        comparison = {
+            'previous_snapshot': self._get_most_recent_snapshot(),
+            'previous_manifest': None,
+            'previous_pages': {},
+            'previous_normalized': {},
+            'previous_merkle': {},
+            'pages': {}
+        }
+
+        if comparison['previous_snapshot']:
+            previous_manifest_file = comparison['previous_snapshot'] / 'manifest.json'
+            if previous_manifest_file.exists():
+                with open(previous_manifest_file, 'r') as f:
+                    comparison['previous_manifest'] = json.load(f)
+
+                # Index successful previous pages by URL (first entry wins, as before)
+                for page in comparison['previous_manifest']['pages']:
+                    if page['status'] == 'success':
+                        comparison['previous_pages'].setdefault(page['url'], page)
+
+            # Merkle trees of the previous pages, if made by the normalizer in use
+            merkle_file = comparison['previous_snapshot'] / 'merkle.json.gz'
+            if merkle_file.exists():
+                try:
+                    with gzip.open(merkle_file, 'rt', encoding='utf-8') as f:
+                        merkle = json.load(f)
+                except (OSError, EOFError, ValueError) as e:
+                    # Damaged file: compare without the trees, as if there were none
+                    self.logger.warning(f"Ignoring unreadable {merkle_file}: {e}")
+                else:
+                    if merkle.get('normalizer') == self.normalizer_id and merkle.get('format') == MERKLE_FORMAT:
+                        comparison['previous_merkle'] = merkle['pages']
+
+        return comparison
+
+    def _compare_page(self, temp_page, comparison):
+        """Classify one fetched page against the previous snapshot
+
+        Returns a result dict with 'status' (unchanged / changed / insignificant /
+        new / failed) and, for pages present in both snapshots, normalized length
+        metrics. 'insignificant' is a change at least similarity_threshold similar
+        to the previous version, with its 'similarity'.
+        """
+        url = temp_page['url']
+        if url in comparison['pages']:
+            return comparison['pages'][url]
+
+        result = {'url': url}
+        prev_page = comparison['previous_pages'].get(url)
+
+        if temp_page['status'] != 'success':
+            result['status'] = 'failed'
+        elif not prev_page:
+            result['status'] = 'new'
+        elif temp_page.get('not_modified'):
+            # A 304 answer means unchanged - nothing to download, parse or normalize
+            result['status'] = 'unchanged'
+            result['previous_length'] = result['current_length'] = prev_page.get('normalized_length')
+        else:
+            current_hash = self._get_fingerprint(temp_page)
+            current_length = temp_page['normalized_length']
+
+            if self._has_usable_fingerprint(prev_page):
+                # Compare against the fingerprint stored at snapshot time
+                changed = current_hash != prev_page['normalized_hash']
+                previous_length = prev_page['normalized_length']
+            else:
+                # Older snapshots have no fingerprint - normalize the previous HTML
+                prev_normalized = self._load_previous_normalized(comparison['previous_snapshot'], prev_page)
+                if prev_normalized is None:
+                    result['status'] = 'changed'
+                    result['previous_missing'] = True
+                    comparison['pages'][url] = result
+                    return result
+                comparison['previous_normalized'][url] = prev_normalized
+                changed = self._get_normalized(temp_page) != prev_normalized
+                previous_length = len(prev_normalized)
+
+            # Calculate rough percentage of change
+            len_diff = abs(current_length - previous_length)
+            avg_len = (current_length + previous_length) / 2
+
+            result['status'] = 'changed' if changed else 'unchanged'
+            if (changed and self.similarity_threshold is not None
+                    and 'similarity_sketch' in prev_page and self._has_usable_fingerprint(prev_page)):
+                # Rotating ads, counters and widgets change a small share of the page
+                result['similarity'] = estimate_similarity(
+                    prev_page['similarity_sketch'], self._get_similarity_sketch(temp_page, comparison))
+                if result['similarity'] >= self.similarity_threshold:
+                    result['status'] = 'insignificant'
+            result['previous_length'] = previous_length
+            result['current_length'] = current_length
+            result['percent_change'] = (len_diff / avg_len) * 100 if avg_len > 0 else 0
+
+        comparison['pages'][url] = result
+        return result
+
+    def _compare_all_pages(self, temp_pages, comparison):
+        """Classify every page against the previous snapshot
+
+        Runs serially: the work is CPU-bound normalization, and the normalizer's
+        rule statistics aren't thread-safe. With cpu_workers the pages were already
+        fingerprinted in worker processes by _summarize_pages.
+        """
+        return [self._compare_page(temp_page, comparison) for temp_page in temp_pages]
+
+    def _reuse_previous_page(self, temp_page, comparison, snapshot_dir):
+        """Carry an unchanged page's files over from the previous snapshot
+
+        Returns the new manifest entry, or None if the previous files are missing
+        and the page has to be archived normally.
+        """
+        previous_snapshot = comparison['previous_snapshot']
+        prev_page = comparison['previous_pages'][temp_page['url']]
+
+        page_entry = dict(prev_page)
+        if not self._has_usable_fingerprint(prev_page):
+            # Stored normalized text and sketch are from another normalizer - don't carry them forward
+            page_entry.pop('normalized_file', None)
+            page_entry.pop('similarity_sketch', None)
+
+        files = [page_entry['file'], page_entry.get('original_file'), page_entry.get('normalized_file')]
+        files = [name for name in files if name]
+        if not all((previous_snapshot / name).exists() for name in files):
+            return None
 
-    def _has_content_changed_from_temp(self, temp_pages):
+        for name in files:
+            if self.incremental:
+                self._link_or_copy(previous_snapshot / name, snapshot_dir / name)
+            else:
+                shutil.copy2(previous_snapshot / name, snapshot_dir / name)
+
+        # Snapshot whose run actually produced these files (kept across chains of reuse)
+        page_entry['content_snapshot'] = prev_page.get('content_snapshot', previous_snapshot.name)
+        page_entry['etag'] = temp_page.get('etag')
+        page_entry['last_modified'] = temp_page.get('last_modified')
+        # Unchanged means the normalized content (and so its fingerprint) is the same
+        if 'normalized_hash' in temp_page:
+            page_entry['normalized_hash'] = temp_page['normalized_hash']
+            page_entry['normalized_length'] = temp_page['normalized_length']
+            page_entry['normalizer'] = self.normalizer_id
+        return page_entry
+
+    def _link_or_copy(self, src, dst):
+        """Hard-link src to dst so unchanged pages take no extra disk space, copying if linking isn't possible"""
+        try:
+            os.link(src, dst)
+        except OSError:
+            # e.g. snapshots on a filesystem without hard links
+            shutil.copy2(src, dst)
+
+    def _get_removed_pages(self, temp_pages, comparison):
+        """Results for pages in the previous snapshot that are no longer monitored"""
+        current_urls = {temp_page['url'] for temp_page in temp_pages}
+        return [
+            {'url': url, 'status': 'removed'}
+            for url in comparison['previous_pages']
+            if url not in current_urls
+        ]
+
+    def _get_change_texts(self, temp_page, comparison):
+        """Normalized text of a changed page now and in the previous snapshot (None if gone)"""
+        url = temp_page['url']
+        prev_normalized = comparison['previous_normalized'].get(url)
+        if prev_normalized is None:
+            prev_page = comparison['previous_pages'][url]
+            prev_normalized = self._load_previous_normalized(comparison['previous_snapshot'], prev_page)
+        return self._get_normalized(temp_page), prev_normalized
+
+    def _log_change_details(self, temp_page, comparison):
+        """Save normalized versions of a changed page and log where they differ"""
+        curr_normalized, prev_normalized = self._get_change_texts(temp_page, comparison)
+        prev_normalized = prev_normalized or ''
+
+        # Save normalized versions for manual inspection
+        debug_dir = self.output_dir / "debug_comparison"
+        debug_dir.mkdir(exist_ok=True)
+
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        curr_file = debug_dir / f"current_{timestamp}.txt"
+        prev_file = debug_dir / f"previous_{timestamp}.txt"
+
+        with open(curr_file, 'w', encoding='utf-8') as f:
+            f.write(curr_normalized)
+        with open(prev_file, 'w', encoding='utf-8') as f:
+            f.write(prev_normalized)
+
+        self.logger.info(f"Saved normalized HTML for comparison:")
+        self.logger.info(f"  Current: {curr_file}")
+        self.logger.info(f"  Previous: {prev_file}")
+        self.logger.info("  Use a diff tool to see exact differences")
+
+        # Show basic stats
+        self.logger.info(f"Length difference: {len(curr_normalized)} vs {len(prev_normalized)}")
+
+        # Bound the changed region on both sides
+        divergence = find_divergence(curr_normalized, prev_normalized)
+        if divergence is None:
+            return
+        start, curr_end, prev_end = divergence
+        self.logger.info(f"Changed region: current [{start}:{curr_end}] ({curr_end - start} chars), "
+                         f"previous [{start}:{prev_end}] ({prev_end - start} chars)")
+
+        # Context windows are sliced per side, since after the first difference
+        # the same offset no longer points at the same content in both strings
+        self.logger.info(f"First difference at position {start}:")
+        self.logger.info(f"Current:  ...{curr_normalized[max(0, start - 150):start + 150]}...")
+        self.logger.info(f"Previous: ...{prev_normalized[max(0, start - 150):start + 150]}...")
+        self.logger.info(f"Last difference at position {curr_end} (current) / {prev_end} (previous):")
+        self.logger.info(f"Current:  ...{curr_normalized[max(0, curr_end - 150):curr_end + 150]}...")
+        self.logger.info(f"Previous: ...{prev_normalized[max(0, prev_end - 150):prev_end + 150]}...")
+
+    def _has_content_changed_from_temp(self, temp_pages, comparison):
         """Check if content has changed by comparing temp downloads to previous snapshot"""
-        previous_snapshot = self._get_most_recent_snapshot()
+        previous_snapshot = comparison['previous_snapshot']
 
         if not previous_snapshot:
             self.logger.info("No previous snapshot found - treating as changed")
@@ -462,97 +2701,61 @@ See CHANGES.txt for details on what changed compared to the previous snapshot.
 
         self.logger.info(f"Comparing to previous snapshot: {previous_snapshot.name}")
 
-        # Load previous manifest
-        previous_manifest_file = previous_snapshot / 'manifest.json'
-        if not previous_manifest_file.exists():
+        if not comparison['previous_manifest']:
             self.logger.info("Previous manifest not found - treating as changed")
             return True
 
-        with open(previous_manifest_file, 'r') as f:
-            previous_manifest = json.load(f)
-
         # Compare number of pages
-        if len(temp_pages) != len(previous_manifest['pages']):
+        if len(temp_pages) != len(comparison['previous_manifest']['pages']):
             self.logger.info("Different number of pages - content changed")
             return True
 
-        # Compare HTML content for each page
+        # Compare content for each page, stopping at the first difference
+        # unless every page is being evaluated
+        changes_detected = False
         for temp_page in temp_pages:
-            if temp_page['status'] != 'success':
-                continue
-
-            # Find corresponding page in previous snapshot
-            prev_page = None
-            for p in previous_manifest['pages']:
-                if p['url'] == temp_page['url'] and p['status'] == 'success':
-                    prev_page = p
-                    break
+            result = self._compare_page(temp_page, comparison)
 
-            if not prev_page:
+            if result['status'] == 'new':
                 self.logger.info(f"New page detected: {temp_page['url']}")
-                return True
-
-            # Load previous HTML (use original if available, otherwise rewritten)
-            if 'original_file' in prev_page:
-                prev_html_file = previous_snapshot / prev_page['original_file']
+            elif result['status'] == 'insignificant':
+                self.logger.info(f"Insignificant change in: {temp_page['url']} "
+                                 f"(similarity {result['similarity']:.1%})")
+                continue
+            elif result['status'] == 'changed':
+                if result.get('previous_missing'):
+                    self.logger.info(f"Previous file not found: {comparison['previous_pages'][temp_page['url']]['file']}")
+                else:
+                    self.logger.info(f"Changes detected in: {temp_page['url']}")
+                    # Debug output only for the first changed page
+                    if not changes_detected:
+                        self._log_change_details(temp_page, comparison)
             else:
-                # Fallback for older snapshots without original files
-                prev_html_file = previous_snapshot / prev_page['file']
+                continue
 
-            if not prev_html_file.exists():
-                self.logger.info(f"Previous file not found: {prev_page['file']}")
+            changes_detected = True
+            if not self.full_change_evaluation:
                 return True
 
-            with open(prev_html_file, 'r', encoding='utf-8') as f:
-                prev_html = f.read()
-
-            # Normalize both versions for comparison
-            curr_normalized = self._normalize_html_for_comparison(temp_page['html'])
-            prev_normalized = self._normalize_html_for_comparison(prev_html)
-
-            if curr_normalized != prev_normalized:
-                self.logger.info(f"Changes detected in: {temp_page['url']}")
-
-                # Save normalized versions for manual inspection
-                debug_dir = self.output_dir / "debug_comparison"
-                debug_dir.mkdir(exist_ok=True)
-
-                timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-                curr_file = debug_dir / f"current_{timestamp}.txt"
-                prev_file = debug_dir / f"previous_{timestamp}.txt"
-
-                with open(curr_file, 'w', encoding='utf-8') as f:
-                    f.write(curr_normalized)
-                with open(prev_file, 'w', encoding='utf-8') as f:
-                    f.write(prev_normalized)
-
-                self.logger.info(f"Saved normalized HTML for comparison:")
-                self.logger.info(f"  Current: {curr_file}")
-                self.logger.info(f"  Previous: {prev_file}")
-                self.logger.info("  Use a diff tool to see exact differences")
-
-                # Show basic stats
-                self.logger.info(f"Length difference: {len(curr_normalized)} vs {len(prev_normalized)}")
-
-                # Find first difference
-                min_len = min(len(curr_normalized), len(prev_normalized))
-                for i in range(min_len):
-                    if curr_normalized[i] != prev_normalized[i]:
-                        start = max(0, i - 150)
-                        end = min(len(curr_normalized), i + 150)
-                        self.logger.info(f"First difference at position {i}:")
-                        self.logger.info(f"Current:  ...{curr_normalized[start:end]}...")
-                        self.logger.info(f"Previous: ...{prev_normalized[start:end]}...")
-                        break
-
-                return True
+        if not changes_detected:
+            if self.similarity_threshold is None:
+                self.logger.info("No content changes detected")
+            else:
+                self.logger.info("No significant content changes detected")
+        return changes_detected
 
-        self.logger.info("No content changes detected")
-        return False
+    def _generate_change_summary(self, snapshot_dir, temp_pages, comparison):
+        """Generate a human-readable summary of what changed (CHANGES.txt) and changes.json"""
+        previous_snapshot = comparison['previous_snapshot']
 
-    def _generate_change_summary(self, snapshot_dir, temp_pages):
-        """Generate a human-readable summary of what changed"""
-        previous_snapshot = self._get_most_recent_snapshot()
+        # Machine-readable counterpart of CHANGES.txt
+        changes = {
+            'timestamp': datetime.now().isoformat(),
+            'website': self.base_url,
+            'compared_to': previous_snapshot.name if previous_snapshot else None,
+            'normalizer': self.normalizer_id,
+            'pages': []
+        }
 
         summary_lines = []
         summary_lines.append("=" * 70)
@@ -565,76 +2768,110 @@ See CHANGES.txt for details on what changed compared to the previous snapshot.
         if not previous_snapshot:
             summary_lines.append("INITIAL SNAPSHOT - No previous version to compare")
             summary_lines.append(f"Archived {len(temp_pages)} pages")
+            changes['pages'] = [{'url': temp_page['url'], 'status': 'new'} for temp_page in temp_pages]
         else:
             summary_lines.append(f"Compared to: {previous_snapshot.name}")
             summary_lines.append("")
 
-            # Load previous manifest
-            previous_manifest_file = previous_snapshot / 'manifest.json'
-            if previous_manifest_file.exists():
-                with open(previous_manifest_file, 'r') as f:
-                    previous_manifest = json.load(f)
-
+            if comparison['previous_manifest']:
                 changes_found = False
 
-                # Check each page for changes
+                # Check each page for changes (results already computed are reused)
                 for temp_page in temp_pages:
-                    if temp_page['status'] != 'success':
-                        continue
+                    result = self._compare_page(temp_page, comparison)
 
-                    # Find corresponding previous page
-                    prev_page = None
-                    for p in previous_manifest['pages']:
-                        if p['url'] == temp_page['url'] and p['status'] == 'success':
-                            prev_page = p
-                            break
-
-                    if not prev_page:
+                    if result['status'] == 'new':
                         summary_lines.append(f"NEW PAGE ADDED:")
-                        summary_lines.append(f"  URL: {temp_page['url']}")
+                        summary_lines.append(f"  URL: {result['url']}")
                         summary_lines.append("")
+                        changes['pages'].append({'url': result['url'], 'status': 'new'})
                         changes_found = True
                         continue
 
-                    # Load previous HTML (use original if available)
-                    if 'original_file' in prev_page:
-                        prev_html_file = previous_snapshot / prev_page['original_file']
-                    else:
-                        prev_html_file = previous_snapshot / prev_page['file']
-
-                    if not prev_html_file.exists():
+                    if result['status'] not in ('changed', 'insignificant') or result.get('previous_missing'):
                         continue
 
-                    with open(prev_html_file, 'r', encoding='utf-8') as f:
-                        prev_html = f.read()
-
-                    # Compare content
-                    curr_normalized = self._normalize_html_for_comparison(temp_page['html'])
-                    prev_normalized = self._normalize_html_for_comparison(prev_html)
-
-                    if curr_normalized != prev_normalized:
+                    previous_length = result['previous_length']
+                    current_length = result['current_length']
+                    page_changes = {
+                        'url': result['url'],
+                        'status': result['status'],
+                        'previous_length': previous_length,
+                        'current_length': current_length,
+                    }
+
+                    # Stored Merkle trees say which regions changed, and which identical
+                    # subtrees the diff can skip
+                    regions, anchors = [], ()
+                    previous_tree = comparison['previous_merkle'].get(result['url'])
+                    if previous_tree:
+                        regions, anchors = compare_merkle_trees(
+                            previous_tree, self._get_merkle_tree(temp_page, comparison), self.diff_max_work)
+                        page_changes['regions'] = regions
+
+                    curr_normalized, prev_normalized = self._get_change_texts(temp_page, comparison)
+                    diff = None
+                    if prev_normalized is not None:
+                        diff = diff_normalized(prev_normalized, curr_normalized, self.diff_max_work, anchors)
+                        page_changes['diff'] = diff
+
+                    if result['status'] == 'insignificant':
+                        summary_lines.append(f"INSIGNIFICANT CHANGES (above similarity threshold):")
+                    else:
                         summary_lines.append(f"CHANGES DETECTED:")
-                        summary_lines.append(f"  Page: {temp_page['url']}")
-
-                        # Calculate rough percentage of change
-                        len_diff = abs(len(curr_normalized) - len(prev_normalized))
-                        avg_len = (len(curr_normalized) + len(prev_normalized)) / 2
-                        percent_change = (len_diff / avg_len) * 100 if avg_len > 0 else 0
-
-                        summary_lines.append(
-                            f"  Content length: {len(prev_normalized):,} → {len(curr_normalized):,} chars")
-                        summary_lines.append(f"  Approximate change: {percent_change:.1f}%")
-
-                        # Try to identify type of change
-                        if len(curr_normalized) > len(prev_normalized) * 1.1:
-                            summary_lines.append(f"  Type: Significant content addition")
-                        elif len(curr_normalized) < len(prev_normalized) * 0.9:
-                            summary_lines.append(f"  Type: Significant content removal")
-                        else:
-                            summary_lines.append(f"  Type: Content modification")
-
-                        summary_lines.append("")
-                        changes_found = True
+                    summary_lines.append(f"  Page: {result['url']}")
+                    summary_lines.append(
+                        f"  Content length: {previous_length:,} → {current_length:,} chars")
+                    if 'similarity' in result:
+                        page_changes['similarity'] = result['similarity']
+                        summary_lines.append(f"  Similarity to previous version: {result['similarity']:.1%}")
+
+                    if diff is None:
+                        summary_lines.append(f"  Approximate change: {result['percent_change']:.1f}%")
+                    else:
+                        # Share of the two texts covered by changed regions - unlike the length
+                        # difference, this is not 0% for an edit that keeps the length
+                        changed_chars = diff['removed_chars'] + diff['added_chars']
+                        total_chars = previous_length + current_length
+                        percent_change = changed_chars / total_chars * 100 if total_chars else 0
+                        page_changes['percent_change'] = percent_change
+                        summary_lines.append(f"  Approximate change: {percent_change:.1f}% "
+                                             f"({diff['removed_chars']:,} chars removed, "
+                                             f"{diff['added_chars']:,} added in {len(diff['hunks'])} regions)")
+
+                    # Try to identify type of change
+                    if current_length > previous_length * 1.1:
+                        summary_lines.append(f"  Type: Significant content addition")
+                    elif current_length < previous_length * 0.9:
+                        summary_lines.append(f"  Type: Significant content removal")
+                    elif diff and not diff['removed_chars']:
+                        summary_lines.append(f"  Type: Content addition")
+                    elif diff and not diff['added_chars']:
+                        summary_lines.append(f"  Type: Content removal")
+                    else:
+                        summary_lines.append(f"  Type: Content modification")
+
+                    for region in regions[:20]:
+                        summary_lines.append(f"  Region {region['status']}: {region['path']}")
+                    if len(regions) > 20:
+                        summary_lines.append(f"  ... {len(regions) - 20} more regions (see changes.json)")
+
+                    if diff:
+                        if not diff['complete']:
+                            summary_lines.append("  Diff: too many differences to align, "
+                                                 "showing the whole changed region")
+                        summary_lines.extend(format_diff_hunks(diff, prev_normalized, curr_normalized))
+
+                    summary_lines.append("")
+                    changes['pages'].append(page_changes)
+                    changes_found = True
+
+                for result in self._get_removed_pages(temp_pages, comparison):
+                    summary_lines.append(f"PAGE REMOVED:")
+                    summary_lines.append(f"  URL: {result['url']}")
+                    summary_lines.append("")
+                    changes['pages'].append(result)
+                    changes_found = True
 
                 if not changes_found:
                     summary_lines.append("NO CHANGES DETECTED")
@@ -653,6 +2890,9 @@ See CHANGES.txt for details on what changed compared to the previous snapshot.
         with open(summary_file, 'w', encoding='utf-8') as f:
             f.write('\n'.join(summary_lines))
 
+        with open(snapshot_dir / 'changes.json', 'w', encoding='utf-8') as f:
+            json.dump(changes, f, indent=2, ensure_ascii=False)
+
         self.logger.info(f"Change summary saved to: {summary_file}")
 
         return '\n'.join(summary_lines)
@@ -841,6 +3081,12 @@ See CHANGES.txt for details on what changed compared to the previous snapshot.
 # USER Example usage
 if __name__ == "__main__":
     # Configure your archiving
+    # Site-specific noise can be normalized away by passing extra rules, e.g.
+    # normalization_rules=DEFAULT_NORMALIZATION_RULES[:-1] + [
+    #     {'name': 'csrf_token', 'pattern': r'name="csrf" value="[^"]*"', 'replacement': 'name="csrf"'},
+    # ] + DEFAULT_NORMALIZATION_RULES[-1:]
+    # Noise the rules can't anticipate (rotating ads, "related" widgets) can be ignored with
+    # similarity_threshold=0.97 - pages at least 97% similar to last time don't trigger a snapshot
     archiver = WebsiteArchiver(
         base_url="https://example.com",
         output_dir="snapshots",
@@ -855,6 +3101,9 @@ if __name__ == "__main__":
         # Add more pages here
     ]
 
+    # To move an existing asset store to the sharded layout once (uncomment next line):
+    # archiver.migrate_asset_layout('sharded')
+
     # Run once for testing
     print("Running single snapshot...")
     archiver.snapshot(pages)
@@ -0,0 +1,83 @@
+"""Benchmark asset hashing on an existing asset store
+
+Usage: python benchmarks/bench_hashing.py [assets_dir] [repeats]
+
+Reports raw throughput of SHA-256 and each installed fast hash, then the cost of
+deduplicating the corpus when every asset shows up `repeats` times in a run
+(as with shared logos, CSS and JS), with and without the fast pre-hash. Repeats
+found by a non-cryptographic pre-hash are confirmed by comparing bytes with a
+stored copy, as WebsiteArchiver does.
+"""
+
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from Snapshot_HTML_Website_to_Internet_Archive_v1 import ContentHasher
+
+
+def load_corpus(assets_dir):
+    corpus = []
+    for path in Path(assets_dir).rglob('*'):
+        if path.is_file() and not path.name.startswith(('.', 'asset_index', 'asset_cache', 'url_index')):
+            corpus.append(path.read_bytes())
+    return corpus
+
+
+def dedup_pass(hasher, corpus, repeats, verify):
+    """Same logic as WebsiteArchiver._get_file_hash, over the corpus `repeats` times"""
+    fast_hashes = {}
+    stored = {}
+    for _ in range(repeats):
+        for content in corpus:
+            fast_digest = hasher.fast(content)
+            if fast_digest is None:
+                hasher.identity(content)
+                continue
+            known = fast_hashes.get(fast_digest)
+            if known and known[1] == len(content) and (not verify or stored[known[0]] == content):
+                continue
+            identity = hasher.identity(content)
+            fast_hashes[fast_digest] = (identity, len(content))
+            # A separate copy, standing in for the asset file on disk
+            stored[identity] = bytearray(content)
+
+
+def timed(label, total_bytes, func):
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<40} {elapsed * 1000:9.1f} ms  {total_bytes / elapsed / 1e6:9.1f} MB/s")
+
+
+if __name__ == "__main__":
+    assets_dir = sys.argv[1] if len(sys.argv) > 1 else "snapshots/assets"
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    corpus = load_corpus(assets_dir)
+    total = sum(len(content) for content in corpus)
+    print(f"Corpus: {len(corpus)} files, {total / 1e6:.1f} MB from {assets_dir}")
+    if not corpus:
+        sys.exit(1)
+
+    sha = ContentHasher(fast_algorithm='none')
+    timed("sha256 (identity)", total, lambda: [sha.identity(c) for c in corpus])
+
+    for algorithm in ('blake3', 'xxh3'):
+        hasher = ContentHasher(fast_algorithm=algorithm)
+        if hasher.fast_name is None:
+            print(f"{algorithm:<40} not installed")
+            continue
+        timed(f"{hasher.fast_name} (fast pre-hash)", total, lambda: [hasher.fast(c) for c in corpus])
+
+    print(f"\nDedup pass, each asset seen {repeats} times:")
+    timed("sha256 only", total * repeats, lambda: dedup_pass(sha, corpus, repeats, verify=False))
+    for algorithm in ('blake3', 'xxh3'):
+        hasher = ContentHasher(fast_algorithm=algorithm)
+        if hasher.fast_name is None:
+            continue
+        timed(f"{hasher.fast_name} + trust", total * repeats,
+              lambda: dedup_pass(hasher, corpus, repeats, verify=False))
+        timed(f"{hasher.fast_name} + byte compare", total * repeats,
+              lambda: dedup_pass(hasher, corpus, repeats, verify=True))
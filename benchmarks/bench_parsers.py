@@ -0,0 +1,60 @@
+"""Conformance check and benchmark for the HTML parser backends
+
+Usage: python benchmarks/bench_parsers.py [fixture_dir]
+
+Normalizes every *.html file in fixture_dir (default: tests/fixtures, or pass a
+snapshot directory to use real pages) with each installed backend. Reports pages
+whose normalized output differs from the html.parser reference, and the time each
+backend takes. Exits non-zero if a backend that 'auto' can pick disagrees with
+the reference; selectolax and lxml are expected to differ on malformed markup.
+"""
+
+import logging
+import sys
+import time
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from Snapshot_HTML_Website_to_Internet_Archive_v1 import (
+    CONFORMING_PARSER_BACKENDS, WebsiteArchiver, installed_parser_backends,
+)
+
+DEFAULT_FIXTURE_DIR = Path(__file__).resolve().parent.parent / 'tests' / 'fixtures'
+
+
+def load_fixtures(fixture_dir):
+    paths = sorted(Path(fixture_dir or DEFAULT_FIXTURE_DIR).glob('*.html'))
+    return [(path.name, path.read_text(encoding='utf-8', errors='replace')) for path in paths]
+
+
+if __name__ == "__main__":
+    fixtures = load_fixtures(sys.argv[1] if len(sys.argv) > 1 else None)
+    total = sum(len(html) for _, html in fixtures)
+    print(f"Fixtures: {len(fixtures)} pages, {total / 1e6:.1f} MB")
+    if not fixtures:
+        sys.exit(1)
+
+    output_dir = tempfile.mkdtemp(prefix="bench_parsers_")
+    results = {}
+    timings = {}
+    for backend in reversed(installed_parser_backends()):
+        archiver = WebsiteArchiver("https://example.com", output_dir=output_dir, parser_backend=backend)
+        logging.getLogger().setLevel(logging.WARNING)
+
+        start = time.perf_counter()
+        results[backend] = [archiver._normalize_html_for_comparison(html) for _, html in fixtures]
+        timings[backend] = time.perf_counter() - start
+
+    reference = results['html.parser']
+    failed = False
+    for backend, normalized in results.items():
+        mismatches = [name for (name, _), ours, ref in zip(fixtures, normalized, reference) if ours != ref]
+        speedup = timings['html.parser'] / timings[backend]
+        print(f"{backend:<12} {timings[backend] * 1000:9.1f} ms  {speedup:5.2f}x  "
+              f"{len(fixtures) - len(mismatches)}/{len(fixtures)} identical to html.parser")
+        for name in mismatches:
+            print(f"    differs: {name}")
+        failed = failed or (bool(mismatches) and backend in CONFORMING_PARSER_BACKENDS)
+
+    sys.exit(1 if failed else 0)
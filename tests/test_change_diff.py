@@ -0,0 +1,76 @@
+"""diff_normalized hunks and what ends up in changes.json"""
+
+import random
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from Snapshot_HTML_Website_to_Internet_Archive_v1 import (
+    DIFF_EXCERPT_LIMIT, build_merkle_tree, compare_merkle_trees, diff_normalized, format_diff_hunks,
+)
+
+
+def apply_hunks(previous, diff):
+    """Rebuild the current text from the previous one and the hunks"""
+    pieces = []
+    position = 0
+    for hunk in diff['hunks']:
+        pieces.append(previous[position:hunk['previous_offset']])
+        pieces.append(hunk['added'])
+        position = hunk['previous_offset'] + hunk['previous_length']
+    pieces.append(previous[position:])
+    return ''.join(pieces)
+
+
+def test_hunks_rebuild_current_text():
+    rng = random.Random(1)
+    tokens = ['<p>', '</p>', 'word ', 'other ', '<a href="/x">', '</a>', ' ']
+    for _ in range(200):
+        previous = ''.join(rng.choice(tokens) for _ in range(rng.randint(0, 40)))
+        current = list(previous)
+        for _ in range(rng.randint(0, 4)):
+            current.insert(rng.randint(0, len(current)), rng.choice('ab <>'))
+        current = ''.join(current)
+        diff = diff_normalized(previous, current)
+        assert diff['complete']
+        assert apply_hunks(previous, diff) == current
+
+
+def test_same_length_edit_is_reported():
+    diff = diff_normalized('<p>Open today</p>', '<p>Shut today</p>')
+    assert [(hunk['removed'], hunk['added']) for hunk in diff['hunks']] == [('Open', 'Shut')]
+
+
+def test_hunk_text_is_clipped_when_work_cap_is_hit():
+    previous = ''.join(f'<li>item {i}</li>' for i in range(20000))
+    current = ''.join(f'<li>entry {i}</li>' for i in range(20000))
+    diff = diff_normalized(previous, current, max_work=1000)
+
+    assert not diff['complete']
+    [hunk] = diff['hunks']
+    assert hunk['previous_length'] > DIFF_EXCERPT_LIMIT
+    assert len(hunk['removed']) < DIFF_EXCERPT_LIMIT + 50
+    assert len(hunk['added']) < DIFF_EXCERPT_LIMIT + 50
+    assert hunk['removed'].endswith(f"[{hunk['previous_length'] - DIFF_EXCERPT_LIMIT:,} more chars]")
+    assert diff['removed_chars'] == hunk['previous_length']
+
+    lines = format_diff_hunks(diff, previous, current)
+    assert f"[{hunk['previous_length'] - 300:,} more chars]" in lines[2]
+
+
+def test_work_cap_is_shared_by_the_whole_page():
+    previous = ''.join(f'<p>item {i} has old text</p><div>same {i}</div>' for i in range(200))
+    current = previous.replace('has old', 'has new')
+    previous_tree, current_tree = build_merkle_tree(previous), build_merkle_tree(current)
+    regions, anchors = compare_merkle_trees(previous_tree, current_tree)
+    assert len(regions) == len(anchors) == 200
+
+    assert diff_normalized(previous, current, anchors=anchors)['complete']
+    diff = diff_normalized(previous, current, max_work=100, anchors=anchors)
+    assert not diff['complete']
+    assert len(diff['hunks']) == 200
+    assert apply_hunks(previous, diff) == current
+
+    # Out of work, the tree walk reports whole subtrees instead
+    regions, _ = compare_merkle_trees(previous_tree, current_tree, max_work=100)
+    assert [region['path'] for region in regions] == ['(page)']
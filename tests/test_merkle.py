@@ -0,0 +1,60 @@
+"""Merkle trees locate changed regions and are stored for the next run"""
+
+import gzip
+import json
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from Snapshot_HTML_Website_to_Internet_Archive_v1 import (
+    MerkleBuilder, WebsiteArchiver, build_merkle_tree, compare_merkle_trees,
+)
+
+
+def deep_page(depth, text):
+    return f"{'<div>' * depth}<p>{text}</p>{'</div>' * depth}"
+
+
+def test_deep_nesting_builds_stores_and_compares():
+    depth = 5000
+    previous = build_merkle_tree(deep_page(depth, 'Open'))
+    current = build_merkle_tree(deep_page(depth, 'Shut'))
+    assert len(current) == depth + 2
+
+    # The stored form round-trips without recursion limits
+    previous = json.loads(json.dumps(previous))
+    regions, anchors = compare_merkle_trees(previous, current)
+    assert [region['status'] for region in regions] == ['changed']
+    assert regions[0]['path'] == f"div > div > div > ({depth - 5} more) > div > div > p"
+    assert regions[0]['current_offset'] == len('<div>') * depth
+    assert anchors == []
+
+
+def test_inserted_item_is_the_only_region():
+    items = [f"<li>item {i}</li>" for i in range(50)]
+    previous = build_merkle_tree(f"<ul>{''.join(items)}</ul>")
+    current_text = f"<ul>{''.join(items[:10] + ['<li>new</li>'] + items[10:])}</ul>"
+    regions, anchors = compare_merkle_trees(previous, build_merkle_tree(current_text))
+    assert [(region['status'], region['path']) for region in regions] == [('added', 'ul > li')]
+    assert current_text[regions[0]['current_offset']:][:len('<li>new</li>')] == '<li>new</li>'
+    assert len(anchors) == 50
+    assert anchors == sorted(anchors)
+
+
+def test_chunked_feed_matches():
+    text = deep_page(40, 'Hello <b>world</b>') + '<script>if (a</b) {}</script><ul><li>x</li></ul>'
+    builder = MerkleBuilder()
+    for start in range(0, len(text), 3):
+        builder.feed(text[start:start + 3])
+    assert builder.close() == build_merkle_tree(text)
+
+
+def test_unreadable_tree_file_is_ignored(tmp_path):
+    archiver = WebsiteArchiver("https://example.com", output_dir=tmp_path)
+    snapshot_dir = archiver.snapshots_dir / '20240101_000000'
+    snapshot_dir.mkdir(parents=True)
+    (snapshot_dir / 'manifest.json').write_text(json.dumps({'pages': []}))
+    # Cut short, as an interrupted write would leave it
+    data = gzip.compress(json.dumps({'normalizer': archiver.normalizer_id, 'pages': {}}).encode())
+    (snapshot_dir / 'merkle.json.gz').write_bytes(data[:len(data) // 2])
+    assert archiver._load_comparison_baseline()['previous_merkle'] == {}
@@ -0,0 +1,59 @@
+"""Normalized output must not depend on which parser backend produced it
+
+Fingerprints stored in the manifest are compared across runs, so a backend that
+'auto' can pick has to normalize every page exactly as html.parser does.
+"""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from Snapshot_HTML_Website_to_Internet_Archive_v1 import (
+    BS4_VERSION, CONFORMING_PARSER_BACKENDS, NormalizationEngine, ParsedPage, StreamingNormalizer,
+    WebsiteArchiver, get_parser_backend, installed_parser_backends, normalize_parsed_page,
+)
+
+FIXTURES = sorted((Path(__file__).parent / 'fixtures').glob('*.html'))
+
+
+def normalize(html, backend):
+    return normalize_parsed_page(ParsedPage(html), backend, NormalizationEngine())
+
+
+@pytest.fixture(params=FIXTURES, ids=lambda path: path.name)
+def fixture_html(request):
+    return request.param.read_text(encoding='utf-8')
+
+
+@pytest.mark.parametrize('backend', [backend for backend in CONFORMING_PARSER_BACKENDS if backend != 'html.parser'])
+def test_conforming_backend_matches_html_parser(fixture_html, backend):
+    if backend not in installed_parser_backends():
+        pytest.skip(f"{backend} is not installed")
+    assert normalize(fixture_html, backend) == normalize(fixture_html, 'html.parser')
+
+
+def test_auto_only_picks_conforming_backends():
+    assert get_parser_backend('auto') in CONFORMING_PARSER_BACKENDS
+
+
+def test_normalization_leaves_tree_untouched(fixture_html):
+    page = ParsedPage(fixture_html)
+    before = page.soup.decode()
+    normalize_parsed_page(page, 'html.parser', NormalizationEngine())
+    assert page.soup.decode() == before
+
+
+@pytest.mark.parametrize('chunk_size', [1, 7, 4096])
+def test_streaming_normalizer_is_chunk_size_independent(fixture_html, chunk_size, monkeypatch):
+    if 'stream' not in installed_parser_backends():
+        pytest.skip("stream backend is unavailable with this bs4 release")
+    monkeypatch.setattr(StreamingNormalizer, 'FEED_SIZE', chunk_size)
+    monkeypatch.setattr(StreamingNormalizer, 'BATCH_SIZE', chunk_size)
+    assert normalize(fixture_html, 'stream') == normalize(fixture_html, 'html.parser')
+
+
+def test_normalizer_id_records_bs4_version(tmp_path):
+    archiver = WebsiteArchiver("https://example.com", output_dir=tmp_path)
+    assert f"+bs4-{BS4_VERSION}+" in archiver.normalizer_id
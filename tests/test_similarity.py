@@ -0,0 +1,54 @@
+"""Similarity sketches decide whether a change is insignificant churn"""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from Snapshot_HTML_Website_to_Internet_Archive_v1 import (
+    SIMILARITY_SKETCH_SIZE, SimilaritySketcher, estimate_similarity, similarity_sketch,
+)
+
+FIXTURES = sorted((Path(__file__).parent / 'fixtures').glob('*.html'))
+
+
+def test_short_pages_get_a_sketch():
+    assert similarity_sketch('<p>Open</p>')
+    assert estimate_similarity(similarity_sketch('<p>Open</p>'),
+                               similarity_sketch('<p>Closed permanently</p>')) < 0.9
+
+
+def test_empty_sketch_is_never_similar():
+    assert similarity_sketch('') == ''
+    assert estimate_similarity('', '') == 0.0
+    assert estimate_similarity('', similarity_sketch('<p>Open</p>')) == 0.0
+
+
+def test_identical_pages_are_fully_similar():
+    for path in FIXTURES:
+        sketch = similarity_sketch(path.read_text(encoding='utf-8'))
+        assert estimate_similarity(sketch, sketch) == 1.0
+
+
+def test_chunked_feed_matches_whole_text():
+    for text in ['<p>Open</p>'] + [path.read_text(encoding='utf-8') for path in FIXTURES]:
+        for chunk_size in (1, 3, 50):
+            sketcher = SimilaritySketcher()
+            for start in range(0, len(text), chunk_size):
+                sketcher.feed(text[start:start + chunk_size])
+            assert sketcher.close() == similarity_sketch(text)
+
+
+def test_small_change_on_a_long_page_is_similar():
+    previous = ' '.join(f'<li>Story number {i} about the news</li>' for i in range(500))
+    current = previous.replace('Story number 250 ', 'Story number 250 updated ')
+    assert estimate_similarity(similarity_sketch(previous), similarity_sketch(current)) > 0.9
+
+
+def test_sketcher_only_keeps_the_sketch():
+    text = ' '.join(f'<li>Story number {i}</li>' for i in range(5000))
+    sketcher = SimilaritySketcher()
+    for start in range(0, len(text), 4096):
+        sketcher.feed(text[start:start + 4096])
+        assert len(sketcher.shingles) <= SIMILARITY_SKETCH_SIZE
+    assert sketcher.close() == similarity_sketch(text)
+    assert len(similarity_sketch(text)) == 16 * SIMILARITY_SKETCH_SIZE